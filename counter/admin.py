@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import Location, Event, Observation
+from .models import Location, Event, Observation, EstimationJob, EventSummary
 
 admin.site.register(Location)
 admin.site.register(Event)
 admin.site.register(Observation)
+admin.site.register(EstimationJob)
+admin.site.register(EventSummary)
 # Register your models here.
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Length, Lower
+
+from .models import Location
+
+# Below this many characters a substring match hits most of the table and the trigram index can not help
+CONTAINS_MIN_LENGTH = 3
+
+FIELDS = ['pk', 'city', 'state', 'country']
+
+
+def normalize_query(query):
+    return ' '.join(query.split()).lower()
+
+
+def search_locations(query, limit):
+    """
+    Locations whose city starts with the query, shortest names first, then the ones whose city contains it.
+    Text after a comma narrows the matches by state or country prefix: 'indianapolis, in'.
+    Both city matches are served by the lower(city) indexes of migration 0009 on PostgreSQL.
+    """
+    city, *narrow = [part.strip() for part in query.split(',')]
+    if not city:
+        return []
+
+    locations = Location.objects.annotate(city_lower=Lower('city'))
+    for part in filter(None, narrow):
+        locations = locations.filter(Q(state__istartswith=part) | Q(country__istartswith=part))
+    ordering = [Length('city'), 'city_lower', 'state', 'country']
+
+    matches = list(locations.filter(city_lower__startswith=city).order_by(*ordering).values(*FIELDS)[:limit])
+    if len(matches) < limit and len(city) >= CONTAINS_MIN_LENGTH:
+        contains = locations.filter(city_lower__contains=city).exclude(city_lower__startswith=city)
+        matches += contains.order_by(*ordering).values(*FIELDS)[:limit - len(matches)]
+
+    for match in matches:
+        match['label'] = f"{match['city']}, {match['state']}, {match['country']}"
+    return matches
+
+
+def autocomplete(query, limit):
+    """
+    Cached search_locations. Every keystroke of a user sends a query and many users type the same prefixes,
+    new locations show up once the cached matches expire.
+    """
+    query = normalize_query(query)
+    key = 'location-autocomplete:%s:%d' % (hashlib.md5(query.encode()).hexdigest(), limit)
+    return cache.get_or_set(
+        key, lambda: search_locations(query, limit), settings.LOCATION_AUTOCOMPLETE_CACHE_SECONDS
+    )
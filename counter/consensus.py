@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+
+# Two-sided 95% normal quantile
+Z = 1.96
+# Relative standard error of a single observation, used where the observed spread is smaller or can not be measured
+PRIOR_RELATIVE_ERROR = {
+    'human': 0.25,
+    'ai': 0.35,
+}
+
+
+def trimmed_mean(values, trim):
+    """
+    Mean of the values without the lowest and highest trim fraction, and its standard error from the
+    winsorized variance (Tukey-McLaughlin). The standard error is None for fewer than two kept values.
+    """
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    n = len(values)
+    g = int(math.floor(trim * n))
+    kept = values[g:n - g]
+    mean = float(kept.mean())
+    if len(kept) < 2:
+        return mean, None
+
+    winsorized = np.clip(values, kept[0], kept[-1])
+    standard_error = math.sqrt((n - 1) * winsorized.var(ddof=1) / (len(kept) * (len(kept) - 1)))
+    return mean, standard_error
+
+
+def group_estimate(values, group, trim):
+    """(estimate, standard error) of one group of observations, None if the group is empty"""
+    if len(values) == 0:
+        return None
+
+    estimate, standard_error = trimmed_mean(values, trim)
+    # the spread of a few observations understates their error, never go below the prior error of their mean
+    prior = PRIOR_RELATIVE_ERROR[group] * max(abs(estimate), 1.0) / math.sqrt(len(values))
+    standard_error = max(standard_error or 0.0, prior)
+    return estimate, standard_error
+
+
+def consensus(counts, is_ai, trim=0.2, human_weight=1.0):
+    """
+    Consensus crowd count of an event. The AI predictions (one per model and weights) and the human counts are
+    each reduced to a trimmed mean, then combined weighted by their inverse variance, with the human
+    estimate's weight scaled by human_weight.
+    :param counts: Array of observed counts.
+    :param is_ai: Boolean array, True where the observation is an AI prediction.
+    :return: Dict with ai_consensus_count, human_consensus_count, consensus_count, consensus_low and
+        consensus_high (95% interval), each None without observations.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    is_ai = np.asarray(is_ai, dtype=bool)
+
+    estimates = {
+        'ai': group_estimate(counts[is_ai], 'ai', trim),
+        'human': group_estimate(counts[~is_ai], 'human', trim),
+    }
+    weights = {'ai': 1.0, 'human': human_weight}
+
+    result = {
+        'ai_consensus_count': estimates['ai'][0] if estimates['ai'] else None,
+        'human_consensus_count': estimates['human'][0] if estimates['human'] else None,
+        'consensus_count': None,
+        'consensus_low': None,
+        'consensus_high': None,
+    }
+
+    groups = [group for group in estimates if estimates[group] and weights[group] > 0]
+    if not groups:
+        return result
+
+    precisions = np.array([weights[group] / estimates[group][1] ** 2 for group in groups])
+    values = np.array([estimates[group][0] for group in groups])
+    estimate = float((precisions * values).sum() / precisions.sum())
+    standard_error = math.sqrt(1 / precisions.sum())
+
+    result['consensus_count'] = estimate
+    result['consensus_low'] = max(estimate - Z * standard_error, 0.0)
+    result['consensus_high'] = estimate + Z * standard_error
+    return result
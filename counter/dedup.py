@@ -0,0 +1,109 @@
+from django.db import connection, transaction
+
+from .models import EstimationJob, Event, EventSummary, Location, Observation
+from .summary import update_event_summary
+
+LOCATION = Location._meta.db_table
+EVENT = Event._meta.db_table
+OBSERVATION = Observation._meta.db_table
+JOB = EstimationJob._meta.db_table
+SUMMARY = EventSummary._meta.db_table
+
+# Locations are the same if they only differ in case or surrounding whitespace, like ingest.normalize_location.
+# The oldest location of a group is kept.
+BUILD_LOCATION_MAP = f"""
+    CREATE TEMPORARY TABLE dedup_location_map AS
+    SELECT old_id, new_id FROM (
+        SELECT id AS old_id,
+               FIRST_VALUE(id) OVER (
+                   PARTITION BY LOWER(TRIM(city)), LOWER(TRIM(state)), LOWER(TRIM(country)) ORDER BY id
+               ) AS new_id
+        FROM {LOCATION}
+    ) grouped
+    WHERE old_id <> new_id
+"""
+
+# Moving events to the kept location can make two of them equal under unique_together (name, date, location),
+# those are merged into the oldest one.
+BUILD_EVENT_MAP = f"""
+    CREATE TEMPORARY TABLE dedup_event_map AS
+    SELECT old_id, new_id FROM (
+        SELECT e.id AS old_id,
+               FIRST_VALUE(e.id) OVER (
+                   PARTITION BY e.name, e.date, COALESCE(m.new_id, e.location_id) ORDER BY e.id
+               ) AS new_id
+        FROM {EVENT} e
+        LEFT JOIN dedup_location_map m ON m.old_id = e.location_id
+        WHERE e.location_id IN (SELECT old_id FROM dedup_location_map UNION SELECT new_id FROM dedup_location_map)
+    ) grouped
+    WHERE old_id <> new_id
+"""
+
+REMAP = """
+    UPDATE {table} SET {column} = (SELECT new_id FROM {map} WHERE old_id = {table}.{column})
+    WHERE {column} IN (SELECT old_id FROM {map})
+"""
+
+REPORT_QUERIES = {
+    'duplicate_groups': "SELECT COUNT(DISTINCT new_id) FROM dedup_location_map",
+    'locations_removed': "SELECT COUNT(*) FROM dedup_location_map",
+    'events_moved': f"SELECT COUNT(*) FROM {EVENT} WHERE location_id IN (SELECT old_id FROM dedup_location_map)",
+    'events_merged': "SELECT COUNT(*) FROM dedup_event_map",
+    'observations_moved': f"SELECT COUNT(*) FROM {OBSERVATION} WHERE event_id IN (SELECT old_id FROM dedup_event_map)",
+    'jobs_moved': f"SELECT COUNT(*) FROM {JOB} WHERE event_id IN (SELECT old_id FROM dedup_event_map)",
+}
+
+SAMPLE_QUERY = f"""
+    SELECT k.id, k.city, k.state, k.country, COUNT(*)
+    FROM dedup_location_map m JOIN {LOCATION} k ON k.id = m.new_id
+    GROUP BY k.id, k.city, k.state, k.country
+    ORDER BY COUNT(*) DESC, k.id
+    LIMIT %s
+"""
+
+
+def dedup_locations(dry_run=False, samples=10):
+    """
+    Merge duplicate locations and the events that collide once their locations are merged, with a handful
+    of set-based statements in one transaction. Observations and estimation jobs follow their events.
+    :param dry_run: Only report what would change.
+    :param samples: Number of duplicate groups to list in the report.
+    :return: Dict with the counts of REPORT_QUERIES and 'samples', a list of
+        (kept id, city, state, country, duplicates) tuples.
+    """
+    report = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(BUILD_LOCATION_MAP)
+        cursor.execute("CREATE INDEX dedup_location_map_old_id ON dedup_location_map (old_id)")
+        cursor.execute(BUILD_EVENT_MAP)
+        cursor.execute("CREATE INDEX dedup_event_map_old_id ON dedup_event_map (old_id)")
+
+        for name, query in REPORT_QUERIES.items():
+            cursor.execute(query)
+            report[name] = cursor.fetchone()[0]
+        cursor.execute(SAMPLE_QUERY, [samples])
+        report['samples'] = cursor.fetchall()
+
+        if dry_run:
+            # the temporary tables are rolled back with everything else
+            transaction.set_rollback(True)
+            return report
+
+        cursor.execute("SELECT DISTINCT new_id FROM dedup_event_map")
+        merged_event_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(REMAP.format(table=OBSERVATION, column='event_id', map='dedup_event_map'))
+        cursor.execute(REMAP.format(table=JOB, column='event_id', map='dedup_event_map'))
+        cursor.execute(f"DELETE FROM {SUMMARY} WHERE event_id IN (SELECT old_id FROM dedup_event_map)")
+        cursor.execute(f"DELETE FROM {EVENT} WHERE id IN (SELECT old_id FROM dedup_event_map)")
+        cursor.execute(REMAP.format(table=EVENT, column='location_id', map='dedup_location_map'))
+        cursor.execute(f"DELETE FROM {LOCATION} WHERE id IN (SELECT old_id FROM dedup_location_map)")
+
+        cursor.execute("DROP TABLE dedup_location_map")
+        cursor.execute("DROP TABLE dedup_event_map")
+
+        # raw SQL sends no signals, merged events need their summaries rebuilt
+        for event_id in merged_event_ids:
+            update_event_summary(event_id)
+
+    return report
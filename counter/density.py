@@ -0,0 +1,92 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Preview widths that can be requested, other widths are rounded up to one of these to bound the cache
+PREVIEW_WIDTHS = [256, 512, 1024, 2048]
+
+# Inferno colormap sampled at 8 points, interpolated to a 256 entry lookup table
+COLORMAP_ANCHORS = np.array([
+    [0, 0, 4],
+    [40, 11, 84],
+    [101, 21, 110],
+    [159, 42, 99],
+    [212, 72, 66],
+    [245, 125, 21],
+    [250, 193, 39],
+    [252, 255, 164],
+], dtype=np.float64)
+COLORMAP = np.stack([
+    np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(COLORMAP_ANCHORS)), channel)
+    for channel in COLORMAP_ANCHORS.T
+], axis=1).round().astype(np.uint8)
+
+
+def density_file(density):
+    """Raw density map at model resolution as a compressed float16 .npz"""
+    buffer = BytesIO()
+    np.savez_compressed(buffer, density=density.astype(np.float16))
+    return ContentFile(buffer.getvalue())
+
+
+def load_density(observation):
+    with observation.density.open('rb') as f:
+        return np.load(f)['density'].astype(np.float32)
+
+
+def normalize(density):
+    """Scale a density map to 0-255, a flat map becomes all zeros"""
+    low, high = float(density.min()), float(density.max())
+    if high <= low:
+        return np.zeros(density.shape, dtype=np.uint8)
+    return ((density - low) * (255 / (high - low))).astype(np.uint8)
+
+
+def render_density(density, size):
+    """Colormapped RGB image of a density map resized to size (width, height)"""
+    image = Image.fromarray(normalize(density), mode='L').resize(size, Image.BILINEAR)
+    image.putpalette(COLORMAP.tobytes())
+    return image.convert('RGB')
+
+
+def preview_width(width):
+    for preview in PREVIEW_WIDTHS:
+        if width <= preview:
+            return preview
+    return PREVIEW_WIDTHS[-1]
+
+
+def preview_size(observation, width):
+    """Preview size with the aspect ratio of the input image, or of the density map if there is none"""
+    if observation.input_image:
+        aspect = observation.input_image.height / observation.input_image.width
+    else:
+        height, density_width = load_density(observation).shape
+        aspect = height / density_width
+    return width, max(1, round(width * aspect))
+
+
+def density_preview(observation, width):
+    """
+    Storage name of a PNG preview of the observation's density map, rendered on first request and kept
+    under density_previews/. Previews are never wider than the input image.
+    """
+    width = preview_width(width)
+    if observation.input_image:
+        width = min(width, observation.input_image.width)
+    name = f'density_previews/observation{observation.pk}_{width}.png'
+    if default_storage.exists(name):
+        return name
+
+    image = render_density(load_density(observation), preview_size(observation, width))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    saved = default_storage.save(name, ContentFile(buffer.getvalue()))
+    if saved != name:
+        # a concurrent request saved the same preview first and storage picked another name, drop the copy
+        default_storage.delete(saved)
+    return name
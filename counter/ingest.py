@@ -0,0 +1,279 @@
+import csv
+import hashlib
+import logging
+import re
+from datetime import datetime, timezone
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Event, Location, Observation
+from .summary import update_event_summary
+
+logger = logging.getLogger(__name__)
+
+# map your free-text Method → choices
+METHOD_MAP = {
+    'hand count using clicker': 'CLICKER',
+    'eyeball estimate': 'EYEBALL',
+    'ai model prediction': 'AI',
+}
+
+# sheet events are all in Indiana
+SHEET_STATE = 'Indiana'
+SHEET_COUNTRY = 'United States'
+
+MANUAL_EVENT = {
+    'name': '50501 Protest',
+    'date': '2025-04-19',
+    'location': ('Indianapolis', 'Indiana', 'United States'),
+    'input_image': 'inputs/3ec5d7a4baaf4881ba433f714f7e4cc5_signal-2025-04-19-170902.jpeg',
+    'observations': [
+        ("CSRNet", "SHA", 906.04, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map.png"),
+        ("CSRNet", "SHB", 1106.04, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_smpOKk2.png"),
+        ("Bay", "SHA", 684.31, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_eEI3eh8.png"),
+        ("Bay", "SHB", 652.99, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_8BmD9At.png"),
+        ("Bay", "QNRF", 644.90, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_Ua1O2o2.png"),
+        ("DM-Count", "SHA", 707.24, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_SYHKvc4.png"),
+        ("DM-Count", "SHB", 789.51, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_LfOBQ0t.png"),
+        ("DM-Count", "QNRF", 622.22, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_PKfPGmE.png"),
+        ("SFANet", "SHB", 744.87, "3ec5d7a4baaf4881ba433f714f7e4cc5_density_map_15FunSA.png"),
+    ],
+}
+
+
+def normalize_location(city, state, country):
+    return (
+        city.strip().lower() if city else '',
+        state.strip().lower() if state else '',
+        country.strip().lower() if country else '',
+    )
+
+
+def parse_date_flexibly(raw_date):
+    """Parse a date string flexibly, returning ISO format or raising ValueError"""
+    raw_date = raw_date.strip()
+
+    # Skip recurring patterns like "Tuesdays"
+    if re.search(r'(every|first|second|third|fourth|last|\bmon|\btue|\bwed|\bthu|\bfri|\bsat|\bsun)', raw_date, re.I):
+        raise ValueError(f"Recurring pattern (not a date): {raw_date}")
+
+    # Skip malformed or multi-date strings
+    if not re.search(r'\d{1,2}/\d{1,2}/\d{2,4}', raw_date):
+        raise ValueError(f"Unrecognized or ambiguous date: {raw_date}")
+
+    try:
+        from dateutil import parser as dateparser
+        return dateparser.parse(raw_date).date().isoformat()
+    except Exception:
+        raise ValueError(f"Unparsable date: {raw_date}")
+
+
+def read_csv(path):
+    """Stream the rows of a CSV file, nothing if it does not exist"""
+    if not path:
+        return
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    except FileNotFoundError:
+        logger.warning("%s not found, skipping", path)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_key(*parts):
+    """Stable key of an imported observation, re-importing the same row updates it instead of adding one"""
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def location_rows(cities_csv, events_csv, sheet_events_csv):
+    """Every (city, state, country) mentioned by the sources, duplicates included"""
+    for row in read_csv(events_csv):
+        city, state, country = (row.get(column, '').strip() for column in ['City', 'State', 'Country'])
+        if city and state and country:
+            yield city, state, country
+    for row in read_csv(sheet_events_csv):
+        city = row.get('City', '').strip()
+        if city:
+            yield city, SHEET_STATE, SHEET_COUNTRY
+    yield MANUAL_EVENT['location']
+    for row in read_csv(cities_csv):
+        yield row['city_ascii'].strip(), row['admin_name'].strip(), row['country'].strip()
+
+
+def event_rows(events_csv, sheet_events_csv):
+    """
+    Events of the sources as dicts with name, date, location and the observations to attach to them.
+    """
+    occurrences = {}
+    for row in read_csv(events_csv):
+        name, date = row['Event Name'].strip(), row['Date'].strip()
+        if not name or not date:
+            logger.warning("Skipping event with missing name or date: %s", row)
+            continue
+        try:
+            count = float(row['Count'])
+        except (ValueError, KeyError):
+            logger.warning("Skipping event with invalid count: %s", row)
+            continue
+
+        location = tuple(row.get(column, '').strip() for column in ['City', 'State', 'Country'])
+        method = METHOD_MAP.get(row.get('Method', '').lower(), 'CLICKER')
+        observer = row.get('Who', '').strip() or None
+
+        # the same observer can count an event more than once, tell the counts apart by their order in the file
+        key = (name, date, normalize_location(*location), method, observer)
+        occurrences[key] = occurrences.get(key, 0) + 1
+
+        yield {
+            'name': name,
+            'date': date,
+            'location': location,
+            'observations': [{
+                'import_key': import_key(*key, occurrences[key]),
+                'count': count,
+                'method': method,
+                'observer': observer,
+            }],
+        }
+
+    for row in read_csv(sheet_events_csv):
+        name, city = row.get('Event Name', '').strip(), row.get('City', '').strip()
+        if not name or not city:
+            logger.warning("Skipping sheet event with missing name or city: %s", row)
+            continue
+        try:
+            date = parse_date_flexibly(row['Date'])
+        except (ValueError, KeyError) as e:
+            logger.warning("Skipping sheet event: %s", e)
+            continue
+        yield {'name': name, 'date': date, 'location': (city, SHEET_STATE, SHEET_COUNTRY), 'observations': []}
+
+    location = normalize_location(*MANUAL_EVENT['location'])
+    yield {
+        'name': MANUAL_EVENT['name'],
+        'date': MANUAL_EVENT['date'],
+        'location': MANUAL_EVENT['location'],
+        'observations': [
+            {
+                'import_key': import_key(MANUAL_EVENT['name'], MANUAL_EVENT['date'], location, model, weight),
+                'count': count,
+                'method': 'AI',
+                'observer': None,
+                'input_image': MANUAL_EVENT['input_image'],
+                'density_map': f'density_maps/{density}',
+                'model_name': model,
+                'weight_selection': weight,
+            }
+            for model, weight, count, density in MANUAL_EVENT['observations']
+        ],
+    }
+
+
+def location_index():
+    return {
+        normalize_location(city, state, country): pk
+        for pk, city, state, country in Location.objects.values_list('pk', 'city', 'state', 'country').iterator()
+    }
+
+
+def event_index():
+    return {
+        (name, date.isoformat(), location_id): pk
+        for pk, name, date, location_id in Event.objects.values_list('pk', 'name', 'date', 'location_id').iterator()
+    }
+
+
+def ingest_locations(rows, batch_size):
+    """Insert the locations not in the database yet, returns the number of new locations"""
+    index = location_index()
+    existing = len(index)
+
+    def new_locations():
+        for city, state, country in rows:
+            key = normalize_location(city, state, country)
+            if key not in index:
+                index[key] = None
+                yield Location(city=city, state=state, country=country)
+
+    for batch in batched(new_locations(), batch_size):
+        Location.objects.bulk_create(batch, ignore_conflicts=True)
+
+    return len(index) - existing
+
+
+def ingest_events(rows, batch_size):
+    """
+    Insert the events not in the database yet and upsert their observations.
+    Returns (new events, observations written, ids of the events with observations).
+    """
+    locations = location_index()
+    events = event_index()
+    existing = len(events)
+    pending_observations = []
+
+    def new_events():
+        for row in rows:
+            location_id = locations.get(normalize_location(*row['location']))
+            if location_id is None:
+                logger.warning("Skipping event with unknown location: %s", row['location'])
+                continue
+            key = (row['name'], row['date'], location_id)
+            if key not in events:
+                events[key] = None
+                yield Event(name=row['name'], date=row['date'], location_id=location_id)
+            for observation in row['observations']:
+                pending_observations.append((key, observation))
+
+    for batch in batched(new_events(), batch_size):
+        Event.objects.bulk_create(batch, ignore_conflicts=True)
+    new_event_count = len(events) - existing
+
+    events = event_index()
+    observations = (
+        Observation(event_id=events[key], **observation)
+        for key, observation in pending_observations
+    )
+    written = 0
+    for batch in batched(observations, batch_size):
+        Observation.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['import_key'],
+            update_fields=['count', 'method', 'observer', 'model_name', 'weight_selection'],
+        )
+        written += len(batch)
+
+    # timestamp is auto_now_add, which bulk_create fills in with the current time: imported counts are dated
+    # at noon of their event
+    dates = {}
+    for key, observation in pending_observations:
+        dates.setdefault(key[1], []).append(observation['import_key'])
+    for date, keys in dates.items():
+        timestamp = datetime.fromisoformat(date).replace(hour=12, tzinfo=timezone.utc)
+        for batch in batched(keys, batch_size):
+            Observation.objects.filter(import_key__in=batch).update(timestamp=timestamp)
+
+    return new_event_count, written, {events[key] for key, _ in pending_observations}
+
+
+def ingest(cities_csv, events_csv, sheet_events_csv, batch_size=5000):
+    """
+    Load the seed CSVs into the database in one transaction. Rows already in the database are skipped,
+    imported observations are updated in place, so running it again is safe.
+    :return: Dict with the number of new locations, new events and written observations.
+    """
+    with transaction.atomic():
+        new_locations = ingest_locations(location_rows(cities_csv, events_csv, sheet_events_csv), batch_size)
+        new_events, observations, event_ids = ingest_events(event_rows(events_csv, sheet_events_csv), batch_size)
+
+        # bulk_create does not send the signals that keep the summaries up to date
+        for event_id in event_ids:
+            update_event_summary(event_id)
+
+    return {'locations': new_locations, 'events': new_events, 'observations': observations}
@@ -0,0 +1,194 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from lwcc import LWCC
+from lwcc.util.cache import ResultCache
+
+from .density import density_file
+from .models import EstimationJob, Observation
+from .summary import deferred_summaries
+
+logger = logging.getLogger(__name__)
+
+# Define choices as lists of tuples
+VALID_MODELS = [
+    'CSRNet',
+    'Bay',
+    'DM-Count',
+    'SFANet',
+]
+VALID_WEIGHTS = [
+    'SHA',
+    'SHB',
+    'QNRF',
+]
+
+
+estimate_cache = ResultCache(settings.ESTIMATE_CACHE_DIR, settings.ESTIMATE_CACHE_MAX_BYTES)
+LWCC.registry.set_max_bytes(settings.ESTIMATE_MODEL_MAX_BYTES)
+
+
+def estimate_specs():
+    return LWCC.ensemble_specs(VALID_MODELS, VALID_WEIGHTS)
+
+
+def is_cached(job):
+    """True if every model has already been run on an identical image"""
+    image_hash = estimate_cache.image_hash(job.input_image.path)
+    return all(
+        estimate_cache.contains(
+            LWCC.cache_key(estimate_cache, image_hash, model, weight, job.resize_img, False, settings.ESTIMATE_TILE_SIZE)
+        )
+        for model, weight in estimate_specs()
+    )
+
+
+def enqueue_estimate(event, uploaded_file, resize_img=False):
+    """Store the upload and queue it for the estimation workers"""
+    job = EstimationJob(event=event, resize_img=resize_img)
+    job.input_image.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    return job
+
+
+def discard_predictions(job):
+    """Delete the observations a job saved before it failed, an event only gets complete ensembles"""
+    for observation in job.observations.all():
+        if observation.density:
+            observation.density.delete(save=False)
+        observation.delete()
+
+
+def fail_stale_jobs():
+    """
+    Fail the running jobs whose worker stopped sending heartbeats, e.g. because it was killed or ran out of
+    memory. They are not retried, the same image could take the next worker down too.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.ESTIMATE_JOB_TIMEOUT)
+    with deferred_summaries(), transaction.atomic():
+        # jobs started before heartbeats were recorded only have started_at
+        stale = EstimationJob.objects.select_for_update(skip_locked=True).filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            status='RUNNING',
+        )
+        for job in stale:
+            logger.warning("Estimation job %s timed out", job.pk)
+            discard_predictions(job)
+            job.status = 'FAILED'
+            job.error = "The estimation worker stopped responding"
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def heartbeat(job):
+    job.heartbeat_at = timezone.now()
+    EstimationJob.objects.filter(pk=job.pk).update(heartbeat_at=job.heartbeat_at)
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None if the queue is empty"""
+    fail_stale_jobs()
+    with transaction.atomic():
+        job = (
+            EstimationJob.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'RUNNING'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def claim_job(job):
+    """Mark a pending job as running, False if a worker got to it first"""
+    started_at = timezone.now()
+    claimed = EstimationJob.objects.filter(pk=job.pk, status='PENDING').update(
+        status='RUNNING', started_at=started_at, heartbeat_at=started_at
+    )
+    if claimed:
+        job.status = 'RUNNING'
+        job.started_at = job.heartbeat_at = started_at
+    return bool(claimed)
+
+
+def save_prediction(job, model, weight, count, density):
+    prediction = Observation(
+        event=job.event,
+        job=job,
+        method='AI prediction',
+        model_name=model,
+        weight_selection=weight,
+        count=float(count),
+    )
+    prediction.input_image.name = job.input_image.name
+    prediction.density.save(f'job{job.pk}_{model}_{weight}.npz', density_file(density), save=False)
+    prediction.save()
+    return prediction
+
+
+def run_job(job):
+    """
+    Run every model on the job's image, saving each observation as soon as its model finishes.
+    The event summary is recomputed once, when the job is done.
+    """
+    with deferred_summaries():
+        try:
+            input_image_path = job.input_image.path
+            for model, weight, count, density in LWCC.iter_counts_ensemble(
+                input_image_path,
+                estimate_specs(),
+                resize_img=job.resize_img,
+                cache=estimate_cache,
+                tile_size=settings.ESTIMATE_TILE_SIZE,
+                multi_head=settings.ESTIMATE_MULTI_HEAD,
+                compiled=settings.ESTIMATE_COMPILED_MODELS,
+                mmap=settings.ESTIMATE_MMAP_WEIGHTS,
+            ):
+                save_prediction(job, model, weight, count, density)
+                heartbeat(job)
+
+            job.status = 'COMPLETE'
+        except Exception as e:
+            logger.exception("Error processing estimation job %s", job.pk)
+            discard_predictions(job)
+            job.status = 'FAILED'
+            job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def run_worker(poll_interval=2.0, once=False):
+    """Pull jobs from the database until stopped, or until the queue is empty if once is set"""
+    # load the models before the first job so it does not wait for the builds
+    if settings.ESTIMATE_WARM_UP_MODELS:
+        LWCC.registry.warm_up([
+            lambda: LWCC.load_ensemble(
+                estimate_specs(),
+                multi_head=settings.ESTIMATE_MULTI_HEAD,
+                compiled=settings.ESTIMATE_COMPILED_MODELS,
+                mmap=settings.ESTIMATE_MMAP_WEIGHTS,
+            )
+        ])
+    logger.info("Estimation worker ready")
+
+    while True:
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        logger.info("Running estimation job %s", job.pk)
+        run_job(job)
+        logger.debug("Model registry: %s", LWCC.registry.stats())
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from counter.dedup import dedup_locations
+
+
+class Command(BaseCommand):
+    help = "Merge locations that only differ in case or whitespace, and the events that collide because of it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without changing it')
+        parser.add_argument('--samples', type=int, default=10, help='Number of duplicate groups to list')
+
+    def handle(self, *args, **options):
+        report = dedup_locations(dry_run=options['dry_run'], samples=options['samples'])
+
+        self.stdout.write(f"{report['duplicate_groups']} locations have duplicates:")
+        for pk, city, state, country, duplicates in report['samples']:
+            self.stdout.write(f"  - {city}, {state}, {country} (ID {pk}): {duplicates} duplicates")
+        self.stdout.write(f"Locations removed:   {report['locations_removed']}")
+        self.stdout.write(f"Events moved:        {report['events_moved']}")
+        self.stdout.write(f"Events merged:       {report['events_merged']}")
+        self.stdout.write(f"Observations moved:  {report['observations_moved']}")
+        self.stdout.write(f"Estimation jobs moved: {report['jobs_moved']}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run, nothing was changed"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Duplicates merged"))
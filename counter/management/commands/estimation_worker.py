@@ -0,0 +1,42 @@
+import multiprocessing
+
+import torch
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from counter.jobs import run_worker
+
+
+def work(poll_interval, once, threads):
+    if threads:
+        torch.set_num_threads(threads)
+    run_worker(poll_interval=poll_interval, once=once)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of estimation workers pulling pending jobs from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--threads', type=int, default=None, help='Torch threads per worker process')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        work_args = (options['poll_interval'], options['once'], options['threads'])
+
+        if options['processes'] == 1:
+            work(*work_args)
+            return
+
+        # every process has to open its own database connection
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=work_args)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} estimation workers")
+        for process in processes:
+            process.join()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from counter.ingest import ingest
+
+
+class Command(BaseCommand):
+    help = "Load locations, events and observations from the seed CSVs. Safe to run again on a seeded database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cities', default='seeding/worldcities.csv', help='worldcities.csv from simplemaps')
+        parser.add_argument('--events', default='seeding/events.csv', help='Events with counts')
+        parser.add_argument('--sheet-events', default='seeding/sheet_events.csv', help='Indiana events sheet')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        result = ingest(options['cities'], options['events'], options['sheet_events'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {result['locations']} locations and {result['events']} events, "
+            f"wrote {result['observations']} observations"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from counter.models import Event
+from counter.summary import update_event_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute the summary and consensus of every event, e.g. after changing the consensus settings"
+
+    def handle(self, *args, **options):
+        event_ids = Event.objects.values_list('pk', flat=True)
+        for event_id in event_ids.iterator():
+            update_event_summary(event_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {event_ids.count()} event summaries"))
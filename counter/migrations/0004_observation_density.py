@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0003_estimationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="density",
+            field=models.FileField(blank=True, null=True, upload_to="densities"),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:00
+
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+from statistics import median
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rounded_median(counts):
+    if not counts:
+        return None
+    return Decimal(median(counts)).quantize(Decimal("0.01"))
+
+
+def build_summaries(apps, schema_editor):
+    Observation = apps.get_model("counter", "Observation")
+    EventSummary = apps.get_model("counter", "EventSummary")
+
+    observations = (
+        Observation.objects.order_by("event_id")
+        .values_list("event_id", "count", "method")
+        .iterator(chunk_size=10000)
+    )
+    summaries = []
+    for event_id, event_rows in groupby(observations, key=itemgetter(0)):
+        event_rows = [(count, method) for _, count, method in event_rows]
+        summaries.append(
+            EventSummary(
+                event_id=event_id,
+                observation_count=len(event_rows),
+                min_count=min(count for count, _ in event_rows),
+                median_count=rounded_median([count for count, _ in event_rows]),
+                max_count=max(count for count, _ in event_rows),
+                ai_consensus_count=rounded_median(
+                    [
+                        count
+                        for count, method in event_rows
+                        if method in ("AI", "AI prediction")
+                    ]
+                ),
+            )
+        )
+        if len(summaries) == 1000:
+            EventSummary.objects.bulk_create(summaries)
+            summaries = []
+    EventSummary.objects.bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0004_observation_density"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventSummary",
+            fields=[
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="counter.event",
+                    ),
+                ),
+                ("observation_count", models.PositiveIntegerField(default=0)),
+                (
+                    "min_count",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "median_count",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "max_count",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "ai_consensus_count",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0005_eventsummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(fields=["-date", "-id"], name="event_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(
+                fields=["event", "-timestamp", "-id"], name="observation_event_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(
+                fields=["event", "method"], name="observation_event_method_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(
+                fields=["event", "model_name", "weight_selection"],
+                name="observation_event_model_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:03
+
+import math
+import statistics
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import migrations, models
+
+# Frozen copy of counter.consensus and of the consensus settings when this migration was written, so later
+# changes to them do not change what it computes
+TRIM = 0.2
+HUMAN_WEIGHT = 1.0
+Z = 1.96
+PRIOR_RELATIVE_ERROR = {"human": 0.25, "ai": 0.35}
+AI_METHODS = ("AI", "AI prediction")
+
+
+def trimmed_mean(values):
+    values = sorted(values)
+    n = len(values)
+    g = math.floor(TRIM * n)
+    kept = values[g : n - g]
+    mean = sum(kept) / len(kept)
+    if len(kept) < 2:
+        return mean, None
+
+    winsorized = [min(max(value, kept[0]), kept[-1]) for value in values]
+    variance = statistics.variance(winsorized)
+    return mean, math.sqrt((n - 1) * variance / (len(kept) * (len(kept) - 1)))
+
+
+def group_estimate(values, group):
+    if not values:
+        return None
+    estimate, standard_error = trimmed_mean(values)
+    prior = (
+        PRIOR_RELATIVE_ERROR[group] * max(abs(estimate), 1.0) / math.sqrt(len(values))
+    )
+    return estimate, max(standard_error or 0.0, prior)
+
+
+def consensus(rows):
+    estimates = {
+        "ai": group_estimate([count for count, ai in rows if ai], "ai"),
+        "human": group_estimate([count for count, ai in rows if not ai], "human"),
+    }
+    weights = {"ai": 1.0, "human": HUMAN_WEIGHT}
+
+    result = {
+        "ai_consensus_count": estimates["ai"][0] if estimates["ai"] else None,
+        "human_consensus_count": estimates["human"][0] if estimates["human"] else None,
+        "consensus_count": None,
+        "consensus_low": None,
+        "consensus_high": None,
+    }
+    groups = [group for group in estimates if estimates[group] and weights[group] > 0]
+    if not groups:
+        return result
+
+    precisions = [weights[group] / estimates[group][1] ** 2 for group in groups]
+    estimate = sum(p * estimates[g][0] for p, g in zip(precisions, groups)) / sum(
+        precisions
+    )
+    standard_error = math.sqrt(1 / sum(precisions))
+    result["consensus_count"] = estimate
+    result["consensus_low"] = max(estimate - Z * standard_error, 0.0)
+    result["consensus_high"] = estimate + Z * standard_error
+    return result
+
+
+def rounded(value):
+    if value is None:
+        return None
+    return Decimal(value).quantize(Decimal("0.01"))
+
+
+def fill_consensus(apps, schema_editor):
+    Observation = apps.get_model("counter", "Observation")
+    EventSummary = apps.get_model("counter", "EventSummary")
+
+    # ai_consensus_count was the median of the predictions, it is now their trimmed mean
+    fields = [
+        "ai_consensus_count",
+        "human_consensus_count",
+        "consensus_count",
+        "consensus_low",
+        "consensus_high",
+    ]
+    observations = (
+        Observation.objects.order_by("event_id")
+        .values_list("event_id", "count", "method")
+        .iterator(chunk_size=10000)
+    )
+    summaries = []
+    for event_id, event_rows in groupby(observations, key=itemgetter(0)):
+        estimate = consensus(
+            [(float(count), method in AI_METHODS) for _, count, method in event_rows]
+        )
+        summaries.append(
+            EventSummary(
+                event_id=event_id,
+                **{field: rounded(estimate[field]) for field in fields},
+            )
+        )
+        if len(summaries) == 1000:
+            EventSummary.objects.bulk_update(summaries, fields)
+            summaries = []
+    EventSummary.objects.bulk_update(summaries, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0006_observation_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventsummary",
+            name="consensus_count",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="eventsummary",
+            name="consensus_high",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="eventsummary",
+            name="consensus_low",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="eventsummary",
+            name="human_consensus_count",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.RunPython(fill_consensus, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0007_eventsummary_consensus"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="import_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=40, null=True, unique=True
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Location autocomplete matches on lower(city): a pattern_ops btree serves the prefix matches and a pg_trgm
+# GIN index the substring matches. Both are PostgreSQL only, other databases scan the table.
+CREATE_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS location_city_prefix_idx ON counter_location (LOWER(city) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS location_city_trgm_idx ON counter_location USING gin (LOWER(city) gin_trgm_ops)",
+]
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS location_city_trgm_idx",
+    "DROP INDEX IF EXISTS location_city_prefix_idx",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0008_observation_import_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_INDEXES), run(DROP_INDEXES)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("counter", "0009_location_city_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="estimationjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -25,6 +25,33 @@ class Event(models.Model):
 
     class Meta:
         unique_together = ['name', 'date', 'location']
+        indexes = [
+            # event_list pages
+            models.Index(fields=['-date', '-id'], name='event_date_idx'),
+        ]
+
+
+class EstimationJob(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETE', 'Complete'),
+        ('FAILED', 'Failed'),
+    ]
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='estimation_jobs')
+    input_image = models.ImageField(upload_to='inputs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    resize_img = models.BooleanField(default=False)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # refreshed by the worker while it runs the job, see jobs.fail_stale_jobs
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Estimation job {self.pk} ({self.get_status_display()}) - {self.event.name}"
 
 
 class Observation(models.Model):
@@ -42,8 +69,13 @@ class Observation(models.Model):
     # New fields moved from Prediction:
     input_image = models.ImageField(upload_to='inputs', blank=True, null=True)
     density_map = models.ImageField(upload_to='density_maps', blank=True, null=True)
+    # raw float16 density at model resolution, previews are rendered from it on request
+    density = models.FileField(upload_to='densities', blank=True, null=True)
     model_name = models.CharField(max_length=50, blank=True, null=True)
     weight_selection = models.CharField(max_length=20, blank=True, null=True)
+    job = models.ForeignKey(EstimationJob, on_delete=models.SET_NULL, blank=True, null=True, related_name='observations')
+    # set on observations loaded by the ingest command, so loading the same rows again updates them
+    import_key = models.CharField(max_length=40, unique=True, blank=True, null=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -51,3 +83,30 @@ class Observation(models.Model):
         if self.method == 'AI':
             return f"AI Observation ({self.model_name}) - {self.event.name}"
         return f"{self.get_method_display()} by {self.observer or 'Unknown'} - {self.event.name}"
+
+    class Meta:
+        indexes = [
+            # event_detail pages
+            models.Index(fields=['event', '-timestamp', '-id'], name='observation_event_time_idx'),
+            models.Index(fields=['event', 'method'], name='observation_event_method_idx'),
+            models.Index(fields=['event', 'model_name', 'weight_selection'], name='observation_event_model_idx'),
+        ]
+
+
+class EventSummary(models.Model):
+    """Aggregates of an event's observations, kept up to date by the Observation signals in counter.signals"""
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    observation_count = models.PositiveIntegerField(default=0)
+    min_count = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    median_count = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    max_count = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # trimmed means of the AI predictions and of the human counts, and their combination, see counter.consensus
+    ai_consensus_count = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    human_consensus_count = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    consensus_count = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    consensus_low = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    consensus_high = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of {self.event.name}: {self.observation_count} observations"
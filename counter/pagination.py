@@ -0,0 +1,96 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset newest first on (field, pk) with cursors instead of page numbers. Every page is one
+    indexed range query, deep pages cost the same as the first one and no COUNT(*) is needed.
+    """
+
+    def __init__(self, queryset, field, per_page):
+        self.queryset = queryset
+        self.field = field
+        self.per_page = per_page
+
+    def encode(self, obj):
+        value = self.queryset.model._meta.get_field(self.field).value_to_string(obj)
+        return base64.urlsafe_b64encode(json.dumps([value, obj.pk]).encode()).decode()
+
+    def decode(self, cursor):
+        """(value, pk) of a cursor, None if it is not valid"""
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return self.queryset.model._meta.get_field(self.field).to_python(value), int(pk)
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def get_page(self, after=None, before=None):
+        """
+        Page of the objects older than the after cursor, or newer than the before cursor. Without a valid
+        cursor the first page is returned, before='last' returns the last page.
+        """
+        if before:
+            key = None if before == 'last' else self.decode(before)
+            if key is not None or before == 'last':
+                return self._page_before(key)
+
+        key = self.decode(after) if after else None
+        queryset = self.queryset.order_by(f'-{self.field}', '-pk')
+        if key is not None:
+            value, pk = key
+            # the redundant bound on field alone lets the database range scan the (field, pk) index, it can not
+            # do that with the OR
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__lte': value}),
+                Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'pk__lt': pk}),
+            )
+
+        objects = list(queryset[:self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        return KeysetPage(
+            objects,
+            self.encode(objects[-1]) if has_next else None,
+            self.encode(objects[0]) if key is not None and objects else None,
+        )
+
+    def _page_before(self, key):
+        queryset = self.queryset.order_by(self.field, 'pk')
+        if key is not None:
+            value, pk = key
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__gte': value}),
+                Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'pk__gt': pk}),
+            )
+
+        objects = list(queryset[:self.per_page + 1])
+        has_previous = len(objects) > self.per_page
+        objects = objects[:self.per_page][::-1]
+        return KeysetPage(
+            objects,
+            self.encode(objects[-1]) if key is not None and objects else None,
+            self.encode(objects[0]) if has_previous else None,
+        )
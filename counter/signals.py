@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Event, Observation
+from .summary import schedule_event_summary
+
+
+@receiver(post_save, sender=Observation)
+def observation_saved(sender, instance, raw=False, **kwargs):
+    # fixtures load rows as they are, run rebuild_event_summaries afterwards
+    if raw:
+        return
+    schedule_event_summary(instance.event_id)
+
+
+@receiver(post_delete, sender=Observation)
+def observation_deleted(sender, instance, origin=None, **kwargs):
+    # when the whole event is deleted its summary goes with it
+    if isinstance(origin, Event) or getattr(origin, 'model', None) is Event:
+        return
+    # the event can also go in a cascade from elsewhere, e.g. from its location, and would get its summary
+    # back half way through it: recompute once the delete is committed, update_event_summary skips events
+    # that are gone
+    event_id = instance.event_id
+    transaction.on_commit(lambda: schedule_event_summary(event_id))
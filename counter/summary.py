@@ -0,0 +1,83 @@
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from statistics import median
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from .consensus import consensus
+from .models import Event, EventSummary, Observation
+
+# jobs save their predictions as 'AI prediction', the form and the seed data use the 'AI' choice
+AI_METHODS = ['AI', 'AI prediction']
+
+
+def to_decimal(value):
+    if value is None:
+        return None
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def update_event_summary(event_id):
+    """Recompute the summary of one event from its observations"""
+    with transaction.atomic():
+        # the summary row may not exist yet, lock the event so concurrent recomputes run one after the other
+        # and the last one sees every observation
+        if not Event.objects.select_for_update().filter(pk=event_id).values_list('pk'):
+            return None
+        return compute_event_summary(event_id)
+
+
+def compute_event_summary(event_id):
+    rows = list(Observation.objects.filter(event_id=event_id).values_list('count', 'method'))
+    counts = np.array([count for count, _ in rows], dtype=np.float64)
+    is_ai = np.array([method in AI_METHODS for _, method in rows], dtype=bool)
+
+    estimate = consensus(
+        counts,
+        is_ai,
+        trim=settings.CONSENSUS_TRIM,
+        human_weight=settings.CONSENSUS_HUMAN_WEIGHT,
+    )
+
+    summary, _ = EventSummary.objects.update_or_create(
+        event_id=event_id,
+        defaults={
+            'observation_count': len(rows),
+            'min_count': min((count for count, _ in rows), default=None),
+            'median_count': to_decimal(median(counts)) if len(rows) else None,
+            'max_count': max((count for count, _ in rows), default=None),
+            **{field: to_decimal(value) for field, value in estimate.items()},
+        },
+    )
+    return summary
+
+
+_deferred = threading.local()
+
+
+def schedule_event_summary(event_id):
+    """Recompute the summary of an event now, or at the end of the enclosing deferred_summaries block"""
+    event_ids = getattr(_deferred, 'event_ids', None)
+    if event_ids is None:
+        update_event_summary(event_id)
+    else:
+        event_ids.add(event_id)
+
+
+@contextmanager
+def deferred_summaries():
+    """Recompute the summary of each event whose observations change in the block once, when it ends"""
+    if getattr(_deferred, 'event_ids', None) is not None:
+        yield
+        return
+    _deferred.event_ids = set()
+    try:
+        yield
+    finally:
+        event_ids, _deferred.event_ids = _deferred.event_ids, None
+        for event_id in event_ids:
+            update_event_summary(event_id)
@@ -1,3 +1,413 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import torch
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from lwcc import LWCC
+from lwcc.models import Bay, DMCount
+from lwcc.models.MultiHead import MultiHeadVGG
+from lwcc.util.cache import ResultCache
+from lwcc.util.tiling import tiled_forward
+
+from . import jobs, summary
+from .consensus import consensus, trimmed_mean
+from .dedup import dedup_locations
+from .density import density_file, density_preview
+from .ingest import ingest
+from .models import EstimationJob, Event, EventSummary, Location, Observation
+from .pagination import KeysetPaginator
+
+
+def random_bay(seed):
+    # randomly initialized, the tests do not download checkpoints
+    torch.manual_seed(seed)
+    return Bay.VGG(Bay.make_layers(Bay.cfg["E"])).eval()
+
+
+def random_dm_count(seed):
+    torch.manual_seed(seed)
+    return DMCount.VGG(DMCount.make_layers(DMCount.cfg["E"])).eval()
+
+
+def random_image(path, size=(192, 128), seed=0):
+    pixels = np.random.RandomState(seed).randint(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+class PreloadedModelCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.img = random_image(f'{directory.name}/crowd.png')
+        self.cache = ResultCache(f'{directory.name}/cache')
+
+    def test_untagged_models_are_not_cached(self):
+        first, second = random_bay(1), random_bay(2)
+        expected = LWCC.get_count(self.img, model=second, resize_img=False)
+
+        LWCC.get_count(self.img, model=first, cache=self.cache, resize_img=False)
+        self.assertEqual(LWCC.get_count(self.img, model=second, cache=self.cache, resize_img=False), expected)
+
+    def test_weights_of_loaded_models_are_part_of_the_key(self):
+        first, second = random_bay(1), random_bay(2)
+        first.model_weights, second.model_weights = 'SHA', 'SHB'
+        expected = LWCC.get_count(self.img, model=second, resize_img=False)
+
+        LWCC.get_count(self.img, model=first, cache=self.cache, resize_img=False)
+        self.assertEqual(LWCC.get_count(self.img, model=second, cache=self.cache, resize_img=False), expected)
+        # a model loaded with the same weights shares the entry
+        third = random_bay(3)
+        third.model_weights = 'SHB'
+        self.assertEqual(LWCC.get_count(self.img, model=third, cache=self.cache, resize_img=False), expected)
+
+
+class MultiHeadTests(SimpleTestCase):
+    def test_each_channel_is_the_output_of_its_model(self):
+        models = [random_bay(1), random_dm_count(2), random_bay(3)]
+        multi_head = MultiHeadVGG(models).eval()
+        x = torch.rand(1, 3, 96, 64, generator=torch.Generator().manual_seed(0))
+
+        with torch.no_grad():
+            output = multi_head(x)
+            for channel, model in enumerate(models):
+                torch.testing.assert_close(output[:, channel:channel + 1], model(x), rtol=1e-4, atol=1e-6)
+
+    def test_multi_head_is_opt_in(self):
+        specs = [('Bay', 'SHA'), ('DM-Count', 'SHB'), ('CSRNet', 'SHA')]
+        self.assertEqual(LWCC.ensemble_runs(specs), [[spec] for spec in specs])
+        self.assertEqual(LWCC.ensemble_runs(specs, multi_head=True), [specs[:2], specs[2:]])
+
+
+def predictions(counts, error=None):
+    for n, count in enumerate(counts):
+        yield 'Bay', f'W{n}', count, np.zeros((4, 4), dtype=np.float32)
+    if error is not None:
+        raise error
+
+
+class EstimationJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        location = Location.objects.create(city='Springfield', state='IL', country='US')
+        self.event = Event.objects.create(name='March', date=date(2025, 4, 5), location=location)
+        self.job = EstimationJob(event=self.event, status='RUNNING')
+        self.job.input_image.save('crowd.png', ContentFile(b''))
+
+    def run_job(self, counts, error=None):
+        with mock.patch.object(LWCC, 'iter_counts_ensemble', return_value=predictions(counts, error)), \
+                mock.patch.object(summary, 'compute_event_summary', wraps=summary.compute_event_summary) as compute:
+            jobs.run_job(self.job)
+        return compute.call_count
+
+    def test_summary_is_computed_once_per_job(self):
+        self.assertEqual(self.run_job([100, 200, 300]), 1)
+        self.assertEqual(self.job.status, 'COMPLETE')
+        self.assertEqual(self.event.summary.observation_count, 3)
+        self.assertEqual(self.event.summary.median_count, 200)
+
+    def test_failed_job_discards_its_predictions(self):
+        self.run_job([100, 200], error=RuntimeError('out of memory'))
+        self.assertEqual(self.job.status, 'FAILED')
+        self.assertEqual(self.job.observations.count(), 0)
+        self.event.summary.refresh_from_db()
+        self.assertEqual(self.event.summary.observation_count, 0)
+
+
+class DedupLocationsTests(TestCase):
+    def setUp(self):
+        self.kept = Location.objects.create(city='Springfield', state='IL', country='US')
+        self.duplicate = Location.objects.create(city=' springfield', state='il', country='US')
+        Location.objects.create(city='Shelbyville', state='IL', country='US')
+
+        day = date(2025, 4, 5)
+        self.event = Event.objects.create(name='March', date=day, location=self.kept)
+        self.twin = Event.objects.create(name='March', date=day, location=self.duplicate)
+        self.rally = Event.objects.create(name='Rally', date=day, location=self.duplicate)
+        for event, count in [(self.event, 100), (self.twin, 300), (self.twin, 200)]:
+            Observation.objects.create(event=event, count=count, timestamp=timezone.now(), method='CLICKER')
+        self.job = EstimationJob.objects.create(event=self.twin, input_image='inputs/crowd.png')
+
+    def test_dry_run_reports_without_changing_anything(self):
+        report = dedup_locations(dry_run=True)
+
+        self.assertEqual(report['duplicate_groups'], 1)
+        self.assertEqual(report['locations_removed'], 1)
+        self.assertEqual(report['events_moved'], 2)
+        self.assertEqual(report['events_merged'], 1)
+        self.assertEqual(report['observations_moved'], 2)
+        self.assertEqual(report['jobs_moved'], 1)
+        self.assertEqual(report['samples'], [(self.kept.pk, 'Springfield', 'IL', 'US', 1)])
+        self.assertEqual(Location.objects.count(), 3)
+        self.assertEqual(Event.objects.count(), 3)
+
+    def test_merge(self):
+        dedup_locations()
+
+        self.assertFalse(Location.objects.filter(pk=self.duplicate.pk).exists())
+        self.assertFalse(Event.objects.filter(pk=self.twin.pk).exists())
+        self.assertFalse(EventSummary.objects.filter(event_id=self.twin.pk).exists())
+        self.rally.refresh_from_db()
+        self.assertEqual(self.rally.location, self.kept)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.event, self.event)
+        self.assertEqual(self.event.observations.count(), 3)
+
+        event_summary = EventSummary.objects.get(event=self.event)
+        self.assertEqual(event_summary.observation_count, 3)
+        self.assertEqual(event_summary.median_count, 200)
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        location = Location.objects.create(city='Springfield', state='IL', country='US')
+        # several events share a date and several observations a timestamp, the pk breaks the ties
+        for n, day in enumerate([5, 5, 5, 6, 4, 4, 7]):
+            event = Event.objects.create(name=f'March {n}', date=date(2025, 4, day), location=location)
+            timestamp = datetime(2025, 4, 5, day, tzinfo=dt_timezone.utc)
+            Observation.objects.create(event=event, count=n, timestamp=timestamp, method='EYEBALL')
+        self.querysets = {'date': Event.objects.all(), 'timestamp': Observation.objects.all()}
+
+    def paginators(self):
+        for field, queryset in self.querysets.items():
+            with self.subTest(field=field):
+                expected = [obj.pk for obj in queryset.order_by(f'-{field}', '-pk')]
+                yield KeysetPaginator(queryset, field, per_page=3), expected
+
+    def test_after_cursors_walk_every_object_once(self):
+        for paginator, expected in self.paginators():
+            page = paginator.get_page()
+            self.assertFalse(page.has_previous())
+            pks = [obj.pk for obj in page]
+            while page.has_next():
+                page = paginator.get_page(after=page.next_cursor)
+                self.assertTrue(page.has_previous())
+                pks += [obj.pk for obj in page]
+            self.assertEqual(pks, expected)
+
+    def test_before_cursors_walk_back_from_the_last_page(self):
+        for paginator, expected in self.paginators():
+            page = paginator.get_page(before='last')
+            self.assertFalse(page.has_next())
+            self.assertEqual([obj.pk for obj in page], expected[-3:])
+            pages = [[obj.pk for obj in page]]
+            while page.has_previous():
+                page = paginator.get_page(before=page.previous_cursor)
+                pages.insert(0, [obj.pk for obj in page])
+            self.assertEqual(sum(pages, []), expected)
+
+    def test_before_returns_the_previous_page(self):
+        for paginator, expected in self.paginators():
+            second = paginator.get_page(after=paginator.get_page().next_cursor)
+            first = paginator.get_page(before=second.previous_cursor)
+            self.assertEqual([obj.pk for obj in first], expected[:3])
+            self.assertEqual(paginator.get_page(after=first.next_cursor).object_list, second.object_list)
+
+    def test_empty_or_invalid_cursors_return_the_first_page(self):
+        for paginator, expected in self.paginators():
+            # the last one is base64 JSON of the wrong shape
+            for cursor in ['', 'not a cursor', 'WzEsMl0=', 'WyJ4Il0=']:
+                for page in [paginator.get_page(after=cursor), paginator.get_page(before=cursor)]:
+                    self.assertEqual([obj.pk for obj in page], expected[:3])
+                    self.assertFalse(page.has_previous())
+
+
+class ConsensusTests(SimpleTestCase):
+    def test_trimmed_mean_drops_outliers(self):
+        mean, standard_error = trimmed_mean([100, 110, 120, 130, 10000], trim=0.2)
+        self.assertEqual(mean, 120)
+        self.assertGreater(standard_error, 0)
+        self.assertEqual(trimmed_mean([100], trim=0.2), (100, None))
+
+    def test_no_observations(self):
+        self.assertEqual(set(consensus([], []).values()), {None})
+
+    def test_single_group(self):
+        estimate = consensus([100, 120, 140], [True, True, True])
+        self.assertAlmostEqual(estimate['consensus_count'], 120)
+        self.assertAlmostEqual(estimate['ai_consensus_count'], 120)
+        self.assertIsNone(estimate['human_consensus_count'])
+        self.assertLess(estimate['consensus_low'], 120)
+        self.assertGreater(estimate['consensus_high'], 120)
+
+    def test_groups_are_weighted_by_their_precision(self):
+        # the humans agree closely, the models do not
+        counts = [1000, 1010, 990, 1005, 400, 1600, 900, 2200]
+        is_ai = [False] * 4 + [True] * 4
+        estimate = consensus(counts, is_ai, trim=0)
+
+        human, ai = estimate['human_consensus_count'], estimate['ai_consensus_count']
+        self.assertAlmostEqual(human, 1001.25)
+        self.assertAlmostEqual(ai, 1275)
+        self.assertLess(human, estimate['consensus_count'])
+        self.assertLess(estimate['consensus_count'] - human, ai - estimate['consensus_count'])
+
+        self.assertAlmostEqual(consensus(counts, is_ai, trim=0, human_weight=0)['consensus_count'], ai)
+
+    def test_interval_is_not_negative(self):
+        self.assertEqual(consensus([0, 1, 50], [False] * 3)['consensus_low'], 0)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cities = write_csv(f'{directory.name}/cities.csv', [
+            {'city_ascii': 'Springfield', 'admin_name': 'Illinois', 'country': 'United States'},
+            {'city_ascii': 'Bloomington', 'admin_name': 'Indiana', 'country': 'United States'},
+        ])
+        self.events_path = f'{directory.name}/events.csv'
+        self.events = [
+            {'Event Name': 'March', 'Date': '2025-04-05', 'City': 'springfield ', 'State': 'Illinois',
+             'Country': 'United States', 'Count': '1200', 'Method': 'Eyeball estimate', 'Who': 'Ann'},
+            {'Event Name': 'March', 'Date': '2025-04-05', 'City': 'Springfield', 'State': 'Illinois',
+             'Country': 'United States', 'Count': '1500', 'Method': 'Eyeball estimate', 'Who': 'Ann'},
+        ]
+        write_csv(self.events_path, self.events)
+        self.sheet = write_csv(f'{directory.name}/sheet.csv', [
+            {'Event Name': 'Rally', 'Date': '5/13/25', 'City': 'Bloomington'},
+            {'Event Name': 'Vigil', 'Date': 'Every Wednesday', 'City': 'Bloomington'},
+        ])
+
+    def ingest(self):
+        return ingest(self.cities, self.events_path, self.sheet)
+
+    def test_running_again_adds_nothing(self):
+        first = self.ingest()
+        # Springfield and Bloomington, plus Indianapolis of the manual event
+        self.assertEqual(first, {'locations': 3, 'events': 3, 'observations': 11})
+        counts = [model.objects.count() for model in (Location, Event, Observation)]
+
+        self.assertEqual(self.ingest(), {'locations': 0, 'events': 0, 'observations': 11})
+        self.assertEqual([model.objects.count() for model in (Location, Event, Observation)], counts)
+
+    def test_changed_counts_are_updated_in_place(self):
+        self.ingest()
+        self.events[1]['Count'] = '1700'
+        write_csv(self.events_path, self.events)
+        self.ingest()
+
+        event = Event.objects.get(name='March')
+        self.assertEqual(sorted(event.observations.values_list('count', flat=True)), [1200, 1700])
+        self.assertEqual(event.summary.max_count, 1700)
+
+
+class PoolModel(torch.nn.Module):
+    """Local like the real models, with the output stride and blocks of CSRNet"""
+
+    def get_name(self):
+        return 'CSRNet'
+
+    def forward(self, x):
+        return torch.nn.functional.avg_pool2d(x.sum(1, keepdim=True), 8)
+
+
+class TiledForwardTests(SimpleTestCase):
+    model = PoolModel()
+
+    def test_tiles_add_up_to_the_whole_image(self):
+        imgs = torch.rand(2, 3, 403, 597, generator=torch.Generator().manual_seed(0))
+        expected = self.model(imgs)
+
+        for tile_size, tile_overlap in [(128, 32), (256, 128), (200, 0)]:
+            with self.subTest(tile_size=tile_size, tile_overlap=tile_overlap):
+                density = tiled_forward(self.model, imgs, tile_size, tile_overlap)
+                self.assertEqual(density.shape, expected.shape)
+                torch.testing.assert_close(density.sum(dim=(1, 2, 3)), expected.sum(dim=(1, 2, 3)))
+                torch.testing.assert_close(density, expected)
+
+    def test_shape_matches_the_whole_image(self):
+        model = random_bay(1)
+        imgs = torch.rand(1, 3, 203, 309, generator=torch.Generator().manual_seed(0))
+        with torch.no_grad():
+            self.assertEqual(tiled_forward(model, imgs, 128, 32).shape, model(imgs).shape)
+
+    def test_small_images_are_not_tiled(self):
+        model = mock.Mock(side_effect=self.model, **{'get_name.return_value': 'CSRNet'})
+        tiled_forward(model, torch.rand(1, 3, 256, 192), tile_size=256)
+        self.assertEqual(model.call_count, 1)
+
+    def test_overlap_has_to_be_smaller_than_the_tiles(self):
+        with self.assertRaises(ValueError):
+            tiled_forward(self.model, torch.rand(1, 3, 512, 512), tile_size=128, tile_overlap=128)
+
+
+class DensityPreviewTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        location = Location.objects.create(city='Springfield', state='IL', country='US')
+        event = Event.objects.create(name='March', date=date(2025, 4, 5), location=location)
+        self.observation = Observation(event=event, count=10, timestamp=timezone.now(), method='AI prediction')
+        density = np.random.RandomState(0).rand(24, 32).astype(np.float32)
+        self.observation.density.save('density.npz', density_file(density), save=False)
+        self.observation.save()
+
+    def test_preview_is_rendered_once(self):
+        name = density_preview(self.observation, 300)
+        self.assertEqual(name, f'density_previews/observation{self.observation.pk}_512.png')
+        with Image.open(default_storage.path(name)) as image:
+            self.assertEqual(image.size, (512, 384))
+        with mock.patch('counter.density.render_density') as render:
+            self.assertEqual(density_preview(self.observation, 512), name)
+        render.assert_not_called()
+
+    def test_concurrent_renders_leave_one_file(self):
+        name = density_preview(self.observation, 256)
+        # a second request that checked for the preview before the first one saved it
+        exists, answers = default_storage.exists, [False]
+        with mock.patch.object(default_storage, 'exists', lambda name: answers.pop() if answers else exists(name)):
+            self.assertEqual(density_preview(self.observation, 256), name)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'density_previews')), [os.path.basename(name)])
+
+
+class EventSummarySignalTests(TestCase):
+    def setUp(self):
+        self.location = Location.objects.create(city='Springfield', state='IL', country='US')
+        self.event = Event.objects.create(name='March', date=date(2025, 4, 5), location=self.location)
+        for count in [100, 200]:
+            Observation.objects.create(event=self.event, count=count, timestamp=timezone.now(), method='CLICKER')
+
+    def test_deleting_an_observation_updates_the_summary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.observations.filter(count=200).delete()
+        self.event.summary.refresh_from_db()
+        self.assertEqual(self.event.summary.observation_count, 1)
+
+    def test_deleting_an_event(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+        self.assertFalse(EventSummary.objects.exists())
+
+    def test_deleting_a_location(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location.delete()
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(EventSummary.objects.exists())
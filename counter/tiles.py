@@ -0,0 +1,125 @@
+import math
+import os
+import shutil
+import uuid
+
+from PIL import Image
+
+from django.core.files.storage import default_storage
+
+from .density import COLORMAP, load_density, normalize
+
+TILE_SIZE = 256
+TILE_MODES = ['density', 'overlay']
+TILE_FORMATS = {
+    'webp': 'image/webp',
+    'png': 'image/png',
+}
+# Opacity of the densest area when the density map is blended over the input image
+OVERLAY_ALPHA = 0.6
+
+
+def pyramid_size(observation):
+    """Size (width, height) of the most detailed level: the input image, or the density map without one"""
+    if observation.input_image:
+        return observation.input_image.width, observation.input_image.height
+    height, width = load_density(observation).shape
+    return width, height
+
+
+def pyramid_levels(size):
+    """Number of levels, each half the size of the next, until the whole image fits in one tile"""
+    return max(0, math.ceil(math.log2(max(size) / TILE_SIZE))) + 1
+
+
+def level_size(size, levels, z):
+    scale = 2 ** (levels - 1 - z)
+    return math.ceil(size[0] / scale), math.ceil(size[1] / scale)
+
+
+def pyramid_info(observation):
+    size = pyramid_size(observation)
+    levels = pyramid_levels(size)
+    return {
+        'width': size[0],
+        'height': size[1],
+        'tile_size': TILE_SIZE,
+        'levels': [
+            dict(zip(['width', 'height'], level_size(size, levels, z)))
+            for z in range(levels)
+        ],
+        'modes': TILE_MODES,
+        'formats': list(TILE_FORMATS),
+    }
+
+
+def level_dir(observation, mode, format, z):
+    return default_storage.path(f'density_tiles/observation{observation.pk}/{mode}_{format}/{z}')
+
+
+def render_level(observation, mode, size):
+    """Image of one pyramid level, rendered straight from the density map and input image at that size"""
+    intensity = Image.fromarray(normalize(load_density(observation)), mode='L').resize(size, Image.BILINEAR)
+    density = intensity.copy()
+    density.putpalette(COLORMAP.tobytes())
+    density = density.convert('RGB')
+    if mode == 'density':
+        return density
+
+    with observation.input_image.open('rb') as f:
+        photo = Image.open(f)
+        photo.draft('RGB', size)
+        photo = photo.convert('RGB').resize(size, Image.BILINEAR)
+    mask = intensity.point(lambda value: round(value * OVERLAY_ALPHA))
+    return Image.composite(density, photo, mask)
+
+
+def build_level(observation, mode, format, z):
+    """
+    Cut one level of the pyramid into tiles, saved as <x>_<y>.<format>. Levels are built on first access,
+    so the detailed levels of large images are only rendered if someone zooms in. The tiles are written to
+    a temporary directory that is renamed into place, so a level on disk is always complete.
+    """
+    directory = level_dir(observation, mode, format, z)
+    size = pyramid_size(observation)
+    image = render_level(observation, mode, level_size(size, pyramid_levels(size), z))
+
+    tmp_directory = f'{directory}.{uuid.uuid4().hex}.tmp'
+    os.makedirs(tmp_directory)
+    for x in range(math.ceil(image.width / TILE_SIZE)):
+        for y in range(math.ceil(image.height / TILE_SIZE)):
+            tile = image.crop((
+                x * TILE_SIZE,
+                y * TILE_SIZE,
+                min((x + 1) * TILE_SIZE, image.width),
+                min((y + 1) * TILE_SIZE, image.height),
+            ))
+            tile.save(os.path.join(tmp_directory, f'{x}_{y}.{format}'))
+
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # another request built the same level first
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+
+def tile_path(observation, mode, format, z, x, y):
+    """
+    Path of a tile, building its level on first access. Returns None for a tile outside the pyramid.
+    """
+    if mode not in TILE_MODES or format not in TILE_FORMATS:
+        return None
+    if mode == 'overlay' and not observation.input_image:
+        return None
+    if z >= pyramid_levels(pyramid_size(observation)):
+        return None
+
+    directory = level_dir(observation, mode, format, z)
+    if not os.path.isdir(directory):
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        build_level(observation, mode, format, z)
+
+    path = os.path.join(directory, f'{x}_{y}.{format}')
+    if not os.path.isfile(path):
+        return None
+    return path
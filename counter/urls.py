@@ -9,10 +9,17 @@ urlpatterns = [
     path('events/', views.event_list, name='event_list'),
     path('events/<int:pk>/', views.event_detail, name='event_detail'),
     path('events/add/', views.add_event, name='add_event'),
+    path('events/<int:pk>/consensus.json', views.event_consensus, name='event_consensus'),
     # Observation view
     path('estimate/<int:event_id>/', views.estimate, name='estimate'),
     path('observations/<int:pk>/', views.observation_detail, name='observation_detail'),
+    path('observations/<int:pk>/density.png', views.density_preview, name='density_preview'),
+    path('observations/<int:pk>/tiles.json', views.density_tiles, name='density_tiles'),
+    path('observations/<int:pk>/tiles/<str:mode>/<int:z>/<int:x>/<int:y>.<str:format>', views.density_tile, name='density_tile'),
     path('events/<int:event_id>/add-observation/', views.add_observation, name='add_observation'),
     path('events/<int:event_id>/estimate/', views.estimate, name='estimate_crowd'),
+    path('estimate/jobs/<int:pk>/', views.estimation_job, name='estimation_job'),
+    path('estimate/jobs/<int:pk>/status/', views.job_status, name='job_status'),
     # Location views
+    path('locations/autocomplete.json', views.location_autocomplete, name='location_autocomplete'),
 ]
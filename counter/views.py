@@ -1,61 +1,121 @@
+import hashlib
 import logging
 
-import numpy as np
 logger = logging.getLogger(__name__)
 
-import os
-import uuid
-from io import BytesIO
-from PIL import Image
-
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
-from django.core.files.base import ContentFile
-from django.core.files.storage import FileSystemStorage
 from django.core.paginator import Paginator
-
-from policounter import settings
-from lwcc import LWCC
-
-from .models import Location, Event, Observation
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Location, Event, Observation, EstimationJob
+from .pagination import KeysetPaginator
+from .autocomplete import autocomplete
 from .forms import EventForm, ObservationForm, PredictionForm
+from .density import density_preview as render_density_preview
+from .tiles import TILE_FORMATS, pyramid_info, tile_path
+from .jobs import enqueue_estimate, is_cached, claim_job, run_job
 
 
 def index(request):
     context = None
     return render(request, "counts/index.html", context)
 
+def paginate(request, queryset, field, per_page=10):
+    """
+    Page numbers for ?page= links, cursors otherwise. Cursor pages are a single range query on an index,
+    page numbers need a COUNT(*) and an OFFSET that grows with the page.
+    """
+    if 'page' in request.GET:
+        return Paginator(queryset, per_page).get_page(request.GET.get('page'))
+    paginator = KeysetPaginator(queryset, field, per_page)
+    return paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+
 def event_list(request):
-    event_list = Event.objects.all().order_by('-date')  # Get all events (you can filter them as needed)
-    paginator = Paginator(event_list, 10)  # Show 10 events per page
-    page_number = request.GET.get('page')  # Get the current page from the URL
-    events = paginator.get_page(page_number)  # Get the events for the current page
+    # location and summary come in the same query, so a page costs the same whatever the number of events
+    event_list = Event.objects.select_related('location', 'summary').order_by('-date', '-pk')
+    events = paginate(request, event_list, 'date')
     return render(request, 'counts/event_list.html', {'events': events})
 
 def event_detail(request, pk):
-    event = get_object_or_404(Event, pk=pk)
-    observations = event.observations.order_by('-timestamp')  # Get all observations, ordered by timestamp
-    paginator = Paginator(observations, 10)  # Paginate observations (10 per page)
-    page_number = request.GET.get('page')  # Get the current page from the URL
-    observations_page = paginator.get_page(page_number)  # Get the observations for the current page
+    event = get_object_or_404(Event.objects.select_related('location', 'summary'), pk=pk)
+    observations = event.observations.order_by('-timestamp', '-pk')  # Get all observations, ordered by timestamp
+    observations_page = paginate(request, observations, 'timestamp')
 
     return render(request, 'counts/event_detail.html', {
         'event': event,
         'observations': observations_page,  # Pass the paginated observations
     })
 
+def event_consensus(request, pk):
+    """Consensus count of an event for dashboards, read from its maintained summary"""
+    event = get_object_or_404(Event.objects.select_related('summary'), pk=pk)
+    fields = ['observation_count', 'consensus_count', 'consensus_low', 'consensus_high',
+              'ai_consensus_count', 'human_consensus_count', 'updated_at']
+    summary = getattr(event, 'summary', None)
+    data = {field: getattr(summary, field, None) for field in fields}
+    data['event'] = event.pk
+    return JsonResponse(data)
+
 def observation_detail(request, pk):
     """View to display details of a specific observation, including prediction if available"""
     observation = get_object_or_404(Observation, pk=pk)
     return render(request, 'counts/observation_detail.html', {'observation': observation})
 
+def density_preview(request, pk):
+    """Colormapped PNG of an observation's density map, ?width= picks the preview size"""
+    observation = get_object_or_404(Observation, pk=pk)
+    if not observation.density:
+        raise Http404("Observation has no density map")
+    try:
+        width = int(request.GET.get('width', 1024))
+    except ValueError:
+        width = 1024
+    name = render_density_preview(observation, width)
+    return FileResponse(default_storage.open(name, 'rb'), content_type='image/png')
+
+def density_tiles(request, pk):
+    """Size and levels of an observation's tile pyramid, for the overlay viewer"""
+    observation = get_object_or_404(Observation, pk=pk)
+    if not observation.density:
+        raise Http404("Observation has no density map")
+    return JsonResponse(pyramid_info(observation))
+
+def tile_etag(request, pk, mode, z, x, y, format):
+    # tiles never change for a stored density, the file name identifies them
+    density = Observation.objects.filter(pk=pk).values_list('density', flat=True).first()
+    if not density:
+        return None
+    return hashlib.md5(f'{density}:{mode}:{z}/{x}/{y}.{format}'.encode()).hexdigest()
+
+@condition(etag_func=tile_etag)
+def density_tile(request, pk, mode, z, x, y, format):
+    """Tile of an observation's density pyramid, mode is 'density' or 'overlay' (blended over the input image)"""
+    observation = get_object_or_404(Observation, pk=pk)
+    if not observation.density:
+        raise Http404("Observation has no density map")
+    path = tile_path(observation, mode, format, z, x, y)
+    if path is None:
+        raise Http404("No such tile")
+    response = FileResponse(open(path, 'rb'), content_type=TILE_FORMATS[format])
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
 def add_event(request):
+    location = None
     if request.method == 'POST':
         form = EventForm(request.POST)
+        # Add location manually
+        location_id = request.POST.get('location')
+        location = Location.objects.filter(pk=location_id).first() if location_id and location_id.isdigit() else None
+        if location is None:
+            form.add_error(None, "Pick a location from the list")
         if form.is_valid():
-            # Add location manually
-            location_id = request.POST.get('location')
-            location = Location.objects.get(pk=location_id)
             event = form.save(commit=False)
             event.location = location
             event.save()
@@ -63,13 +123,24 @@ def add_event(request):
     else:
         form = EventForm()
 
-    # Prepare JSON for all locations
-    locations = Location.objects.all().values('pk', 'city', 'state', 'country')
+    # locations are searched as the user types, see location_autocomplete
     return render(request, 'counts/add_event.html', {
         'form': form,
-        'locations_json': list(locations),
+        'location': location,
     })
 
+def location_autocomplete(request):
+    """Top matches of ?q= among the locations, for the add event form"""
+    try:
+        limit = int(request.GET.get('limit', settings.LOCATION_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.LOCATION_AUTOCOMPLETE_LIMIT
+    limit = max(1, min(limit, settings.LOCATION_AUTOCOMPLETE_MAX_LIMIT))
+    response = JsonResponse({'results': autocomplete(request.GET.get('q', ''), limit)})
+    # the browser answers repeated keystrokes (typing, then deleting back) without a request
+    patch_cache_control(response, public=True, max_age=settings.LOCATION_AUTOCOMPLETE_CACHE_SECONDS)
+    return response
+
 def add_observation(request, event_id):
     event = get_object_or_404(Event, pk=event_id)
 
@@ -93,83 +164,40 @@ def estimate(request, event_id):
     if request.method == 'POST':
         form = PredictionForm(request.POST, request.FILES)
         if form.is_valid():
-            session_id = uuid.uuid4().hex
-            uploaded_file = request.FILES['input_image']
-            cacheDir = os.path.join(settings.MEDIA_ROOT, 'cache')
-            fs = FileSystemStorage(location=cacheDir)
-            filename = fs.save(f'{session_id}_{uploaded_file.name}', uploaded_file)
-            input_image_path = fs.path(filename)
-            # Load the original image to get its size
-            original_image = Image.open(input_image_path)
-            original_size = original_image.size  # (width, height)
-            # Define choices as lists of tuples
-            VALID_MODELS = [
-                'CSRNet',
-                'Bay',
-                'DM-Count',
-                'SFANet',
-            ]
-            VALID_WEIGHTS = [
-                'SHA',
-                'SHB',
-                'QNRF',
-            ]
-            try:
-                for model in VALID_MODELS:
-                    for weight in VALID_WEIGHTS:
-                        try:
-                            count, density = LWCC.get_count(
-                                input_image_path,
-                                return_density=True,
-                                model_name=model,
-                                model_weights=weight,
-                                resize_img=False,
-                            )
-                        except ValueError as e:
-                            # Log the error
-                            continue  # Skip to the next iteration
-
-                        prediction = form.save(commit=False)  # don't save or we'll error
-                        prediction.crowd_size_prediction = float(count)
-                        # this is bad but it works. don't change.
-                        prediction.input_image.name = filename
-                        density_normalized = (density - density.min()) / (density.max() - density.min())
-                        density_uint8 = (density_normalized * 255).astype(np.uint8)
-                        density_image = Image.fromarray(density_uint8)
-                        density_image_resized = density_image.resize(original_size)
-                        # more jank but i have to have something in memory to write
-                        buffer = BytesIO()
-                        density_image_resized.save(buffer, format='PNG')
-                        out_name = f'{session_id}_density_map.png'
-                        prediction = Observation(
-                            event=event,
-                            method='AI prediction',
-                            model_name=model,
-                            weight_selection=weight,
-                            count=float(count),
-                        )
-                        prediction.density_map.save(out_name, ContentFile(buffer.getvalue()), save=False)
-                        prediction.save()
-
-                # Move the file deletion outside the inner loop but inside the outer try block
-                # (after all models and weights have been processed)
-                if os.path.exists(input_image_path):
-                    os.remove(input_image_path)  # remove the cache file
-
-                # Redirect to the event detail page after successful processing
-                # Hardcoding the URL to match your URL patterns
-                return redirect(f'/events/{event_id}/')
-            except Exception as e:
-                # Catch any unexpected exceptions
-                print(f"Error processing file: {e}")
-                # Still try to clean up if possible
-                if 'input_image_path' in locals() and os.path.exists(input_image_path):
-                    try:
-                        os.remove(input_image_path)
-                    except OSError as e:
-                        print(f"Error deleting file {input_image_path}: {e}")
-                messages.error(request, "An error occurred while processing the image.")
+            job = enqueue_estimate(event, request.FILES['input_image'])
+            if is_cached(job) and claim_job(job):
+                # a repeated upload, no need to wait for a worker
+                run_job(job)
+                return redirect('counts:event_detail', pk=event.id)
+            messages.success(request, "Image queued, the estimates will appear as each model finishes.")
+            return redirect('counts:estimation_job', pk=job.pk)
     else:
         form = PredictionForm()
 
     return render(request, 'prediction_form.html', {'form': form, 'event': event})
+
+def estimation_job(request, pk):
+    """Status page for an estimation job, polls job_status until the job is finished"""
+    job = get_object_or_404(EstimationJob, pk=pk)
+    return render(request, 'counts/estimation_job.html', {'job': job})
+
+def job_status(request, pk):
+    """JSON status of an estimation job and the observations it has produced so far"""
+    job = get_object_or_404(EstimationJob, pk=pk)
+    observations = job.observations.order_by('pk')
+    return JsonResponse({
+        'id': job.pk,
+        'event': job.event_id,
+        'status': job.status,
+        'error': job.error,
+        'observations': [
+            {
+                'id': obs.pk,
+                'model_name': obs.model_name,
+                'weight_selection': obs.weight_selection,
+                'count': float(obs.count),
+                'url': reverse('counts:observation_detail', args=[obs.pk]),
+            }
+            for obs in observations
+        ],
+    })
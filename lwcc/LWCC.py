@@ -1,42 +1,139 @@
-from .models import CSRNet, SFANet, Bay, DMCount
-from .util.functions import load_image
+from .models import CSRNet, SFANet, Bay, DMCount, MultiHead
+from .util.functions import load_image, read_image, transform_image, preprocess_key
+from .util.tiling import tiled_forward
+from .util.batching import batched_forward
+from .util.precision import (
+    check_precision,
+    precision_context,
+    quantize,
+    QuantizedModel,
+)
+from .util.compiled import CompiledModel
+from .util.registry import ModelRegistry
+from .util.streaming import chunks, prefetch
 
+import os
 import torch
 
+available_models = {
+    "CSRNet": CSRNet,
+    "SFANet": SFANet,
+    "Bay": Bay,
+    "DM-Count": DMCount,
+}
 
-def load_model(model_name="CSRNet", model_weights="SHA"):
+# models built by the load functions, shared by the whole process
+registry = ModelRegistry()
+
+
+def load_model(
+    model_name="CSRNet",
+    model_weights="SHA",
+    precision="fp32",
+    calibration_dir=None,
+    compiled=False,
+    mmap=False,
+):
     """
-    Builds a model for Crowd Counting and initializes it as a singleton.
+    Builds a model for Crowd Counting and keeps it in the model registry.
     :param model_name: One of the available models: CSRNet.
     :param model_weights: Name of the dataset the model was pretrained on. Possible values vary on the model.
+    :param precision: One of "fp32", "bf16" (fp32 weights run under autocast) or "int8" (post-training static
+            quantization). Default: "fp32"
+    :param calibration_dir: Directory with sample crowd images to calibrate the int8 model on.
+    :param compiled: Use TorchScript artifacts cached under ~/.lwcc/compiled, fp32 only. Default: False
+    :param mmap: Memory-map the weights from a copy under ~/.lwcc/weights, so processes loading the same model share
+            its memory. Not used by compiled and int8 models, which hold their own transformed weights. Default: False
     :return: Built Crowd Counting model initialized with pretrained weights.
     """
+    model = available_models.get(model_name)
+    if not model:
+        raise ValueError(
+            "Invalid model_name. Model {} is not available.".format(model_name)
+        )
 
-    available_models = {
-        "CSRNet": CSRNet,
-        "SFANet": SFANet,
-        "Bay": Bay,
-        "DM-Count": DMCount,
-    }
+    check_precision(precision)
+    if compiled:
+        # the eager model is only needed to trace missing buckets, keep it out of the registry
+        loaded = load_compiled(
+            "{}_{}".format(model_name, model_weights),
+            model_name,
+            lambda: model.make_model(model_weights, mmap).eval(),
+            precision,
+        )
+    elif precision == "int8":
+        loaded = load_quantized(
+            "{}_{}_int8".format(model_name, model_weights),
+            lambda: load_model(model_name, model_weights, mmap=mmap),
+            calibration_dir,
+        )
+    else:
+        model_full_name = "{}_{}".format(model_name, model_weights)
+        if mmap:
+            model_full_name += "_mmap"
+        loaded = registry.get(
+            model_full_name, lambda: model.make_model(model_weights, mmap).eval()
+        )
 
-    global loaded_models
+    # get_count needs the weights of a preloaded model for its cache keys
+    loaded.model_weights = model_weights
+    return loaded
 
-    if "loaded_models" not in globals():
-        loaded_models = {}
 
-    model_full_name = "{}_{}".format(model_name, model_weights)
-    if model_full_name not in loaded_models.keys():
-        model = available_models.get(model_name)
-        if model:
-            model = model.make_model(model_weights)
-            loaded_models[model_full_name] = model
-            print("Built model {} with weights {}".format(model_name, model_weights))
-        else:
-            raise ValueError(
-                "Invalid model_name. Model {} is not available.".format(model_name)
-            )
+def load_multi_head(
+    specs, precision="fp32", calibration_dir=None, compiled=False, mmap=False
+):
+    """
+    Builds a multi-head model running several Bay / DM-Count checkpoints in one pass and keeps it in the model registry.
+    :param specs: List of (model_name, model_weights) tuples, model_name is either "Bay" or "DM-Count".
+    :param precision: See load_model. Default: "fp32"
+    :param calibration_dir: Directory with sample crowd images to calibrate the int8 model on.
+    :param compiled: See load_model. Default: False
+    :param mmap: See load_model. Default: False
+    :return: Built MultiHeadVGG, output channel i holds the density map of specs[i].
+    """
+    model_full_name = "MultiHead_" + "+".join(
+        "{}_{}".format(model_name, model_weights) for model_name, model_weights in specs
+    )
+
+    check_precision(precision)
+    if compiled:
+        return load_compiled(
+            model_full_name,
+            "MultiHead",
+            lambda: MultiHead.make_model(specs, mmap).eval(),
+            precision,
+        )
+    if precision == "int8":
+        return load_quantized(
+            model_full_name + "_int8",
+            lambda: load_multi_head(specs, mmap=mmap),
+            calibration_dir,
+        )
 
-    return loaded_models[model_full_name]
+    if mmap:
+        model_full_name += "_mmap"
+
+    return registry.get(
+        model_full_name, lambda: MultiHead.make_model(specs, mmap).eval()
+    )
+
+
+def load_quantized(model_full_name, load_fp32, calibration_dir):
+    if calibration_dir is None:
+        raise ValueError("The int8 precision needs a calibration_dir.")
+
+    return registry.get(model_full_name, lambda: quantize(load_fp32(), calibration_dir))
+
+
+def load_compiled(model_full_name, name, load_eager, precision):
+    if precision != "fp32":
+        raise ValueError("Compiled models are only available in fp32 precision.")
+
+    return registry.get(
+        model_full_name + "_compiled",
+        lambda: CompiledModel(model_full_name, name, load_eager),
+    )
 
 
 def get_count(
@@ -47,6 +144,15 @@ def get_count(
     is_gray=False,
     return_density=False,
     resize_img=True,
+    cache=None,
+    tile_size=None,
+    tile_overlap=128,
+    max_batch_size=8,
+    max_pixels=None,
+    precision="fp32",
+    calibration_dir=None,
+    compiled=False,
+    mmap=False,
 ):
     """
     Return the count on image/s. You can use already loaded model or choose the name and pre-trained weights.
@@ -58,6 +164,18 @@ def get_count(
     :param return_density: Return the predicted density maps for input? Default: False.
     :param resize_img: Should images with high resolution be down-scaled? This is especially good for high resolution
             images with relatively few people. For very dense crowds, False is recommended. Default: True
+    :param cache: Possible ResultCache, images predicted before with the same settings are not run again. Not used
+            with a preloaded model that was not built by load_model, whose weights are unknown. Default: None.
+    :param tile_size: Run images larger than tile_size pixels on overlapping tiles of at most this size and blend the
+            density maps. Bounds the memory of full resolution predictions. Default: None (no tiling)
+    :param tile_overlap: Overlap of neighbouring tiles in pixels. Default: 128
+    :param max_batch_size: Images are grouped by shape and run in batches of at most this many images. Smaller images
+            in a batch are zero padded and the padding is cropped out of their density maps. Default: 8
+    :param max_pixels: Maximum number of padded pixels in a batch. Default: None (no limit)
+    :param precision: If not using preloaded model, "fp32", "bf16" or "int8", see load_model. Default: "fp32"
+    :param calibration_dir: Directory with sample crowd images to calibrate the int8 model on. Default: None.
+    :param compiled: If not using preloaded model, use TorchScript artifacts cached under ~/.lwcc/compiled. Default: False
+    :param mmap: If not using preloaded model, memory-map its weights, see load_model. Default: False
     :return: Depends on whether the input is a String or list and on the return_density flag.
         If input is a String, the output is a float with the predicted count.
         If input is a list, the output is a dictionary with image names as keys, and predicted counts (float) as values.
@@ -69,27 +187,75 @@ def get_count(
     if type(img_paths) != list:
         img_paths = [img_paths]
 
-    # load model
-    if model is None:
-        model = load_model(model_name, model_weights)
+    if model is not None:
+        model_name = model.get_name()
+        # the cache key has to name the weights the model was loaded with, which only load_model records
+        model_weights = getattr(model, "model_weights", None)
+        if model_weights is None:
+            cache = None
+        # int8 is a property of the model, bf16 of the run
+        if isinstance(model, QuantizedModel):
+            precision = "int8"
+        elif precision == "int8":
+            precision = "fp32"
+
+    counts, densities = {}, {}
 
     # load images
-    imgs, names = [], []
+    imgs, names, keys = [], [], []
 
     for img_path in img_paths:
-        img, name = load_image(img_path, model.get_name(), is_gray, resize_img)
+        key = None
+        if cache is not None:
+            key = cache_key(
+                cache,
+                cache.image_hash(img_path),
+                model_name,
+                model_weights,
+                resize_img,
+                is_gray,
+                tile_size,
+                tile_overlap,
+                precision,
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                name = os.path.basename(img_path).split(".")[0]
+                counts[name], densities[name] = cached
+                continue
+
+        img, name = load_image(img_path, model_name, is_gray, resize_img)
         imgs.append(img)
         names.append(name)
+        keys.append(key)
 
-    imgs = torch.cat(imgs)
+    if imgs:
+        # load model
+        if model is None:
+            model = load_model(
+                model_name, model_weights, precision, calibration_dir, compiled, mmap
+            )
 
-    with torch.set_grad_enabled(False):
-        outputs = model(imgs)
+        with torch.set_grad_enabled(False), precision_context(precision):
+            if tile_size:
+                # tiles of images with different sizes do not line up, run them one by one
+                outputs = [
+                    tiled_forward(model, img, tile_size, tile_overlap) for img in imgs
+                ]
+            else:
+                outputs = batched_forward(model, imgs, max_batch_size, max_pixels)
 
-    counts = torch.sum(outputs, (1, 2, 3)).numpy()
-    counts = dict(zip(names, counts))
+        for name, key, output in zip(names, keys, outputs):
+            output = output.float()
+            count, density = torch.sum(output).item(), output[0, 0, :, :].numpy()
+            counts[name], densities[name] = count, density
+            if key is not None:
+                cache.put(key, count, density)
 
-    densities = dict(zip(names, outputs[:, 0, :, :].numpy()))
+    # keep the order of the input
+    order = [os.path.basename(img_path).split(".")[0] for img_path in img_paths]
+    counts = {name: counts[name] for name in order}
+    densities = {name: densities[name] for name in order}
 
     if len(counts) == 1:
         if return_density:
@@ -101,3 +267,315 @@ def get_count(
         return counts, densities
 
     return counts
+
+
+def iter_counts(
+    img_paths,
+    model_name="CSRNet",
+    model_weights="SHA",
+    model=None,
+    is_gray=False,
+    resize_img=True,
+    tile_size=None,
+    tile_overlap=128,
+    max_batch_size=8,
+    max_pixels=None,
+    precision="fp32",
+    calibration_dir=None,
+    compiled=False,
+    mmap=False,
+    workers=4,
+    chunk_size=64,
+):
+    """
+    Streaming version of get_count for more images than fit in memory. Images are decoded on a thread pool ahead
+    of the model and counted in chunks, so only about two chunks of images are held at a time.
+    :param img_paths: Iterable of paths to the images, read lazily.
+    :param workers: Number of image decoding threads. Default: 4
+    :param chunk_size: Number of decoded images batched together by shape, see max_batch_size. Default: 64
+    :return: Generator of (img_path, count, error) tuples in the order of img_paths. If an image can not be
+        decoded, count is None and error holds the exception.
+    See get_count for the other parameters.
+    """
+    if model is not None:
+        model_name = model.get_name()
+
+    decoded = prefetch(
+        lambda img_path: load_image(img_path, model_name, is_gray, resize_img)[0],
+        img_paths,
+        workers,
+        max_pending=chunk_size,
+    )
+
+    for chunk in chunks(decoded, chunk_size):
+        imgs = [img for _, img, error in chunk if error is None]
+
+        outputs = []
+        if imgs:
+            if model is None:
+                model = load_model(
+                    model_name,
+                    model_weights,
+                    precision,
+                    calibration_dir,
+                    compiled,
+                    mmap,
+                )
+
+            with torch.set_grad_enabled(False), precision_context(precision):
+                if tile_size:
+                    outputs = [
+                        tiled_forward(model, img, tile_size, tile_overlap)
+                        for img in imgs
+                    ]
+                else:
+                    outputs = batched_forward(model, imgs, max_batch_size, max_pixels)
+
+        outputs = iter(outputs)
+        for img_path, _, error in chunk:
+            if error is None:
+                yield img_path, torch.sum(next(outputs).float()).item(), None
+            else:
+                yield img_path, None, error
+
+
+def cache_key(
+    cache,
+    image_hash,
+    model_name,
+    model_weights,
+    resize_img=True,
+    is_gray=False,
+    tile_size=None,
+    tile_overlap=128,
+    precision="fp32",
+):
+    """
+    Key of a prediction in a ResultCache. Settings left at their default are not part of the key, so
+    keys stay the same when new settings are added.
+    """
+    settings = [model_name, model_weights, resize_img, is_gray]
+    if tile_size:
+        settings += [tile_size, tile_overlap]
+    if precision != "fp32":
+        settings += [precision]
+    return cache.key(image_hash, *settings)
+
+
+def ensemble_specs(model_names=None, model_weights=None):
+    """
+    Build the list of valid (model_name, model_weights) pairs out of the given models and weights.
+    :param model_names: List of model names. Default: all available models.
+    :param model_weights: List of weight names. Default: every weight the model supports.
+    :return: List of (model_name, model_weights) tuples, invalid combinations are left out.
+    """
+    if model_names is None:
+        model_names = list(available_models.keys())
+
+    specs = []
+    for model_name in model_names:
+        model = available_models.get(model_name)
+        if not model:
+            raise ValueError(
+                "Invalid model_name. Model {} is not available.".format(model_name)
+            )
+        for weights in model.available_weights:
+            if model_weights is None or weights in model_weights:
+                specs.append((model_name, weights))
+
+    return specs
+
+
+def ensemble_runs(specs, multi_head=False):
+    """
+    Validate the specs and group them into runs, each run is computed by one forward pass.
+    :param specs: List of (model_name, model_weights) tuples.
+    :param multi_head: Group all Bay / DM-Count checkpoints into one multi-head run? It saves the repeated
+        image passes but its grouped convolutions are slower than separate runs on CPU. Default: False
+    :return: List of runs, each run is a list of (model_name, model_weights) tuples.
+    """
+    # validate all specs up front so nothing is computed for a bad request
+    for model_name, model_weights in specs:
+        model = available_models.get(model_name)
+        if not model:
+            raise ValueError(
+                "Invalid model_name. Model {} is not available.".format(model_name)
+            )
+        if model_weights not in model.available_weights:
+            raise ValueError(
+                "Weights {} not available for {}. Available weights: {}".format(
+                    model_weights, model_name, model.available_weights
+                )
+            )
+
+    runs = []
+    multi_head_specs = [spec for spec in specs if spec[0] in MultiHead.available_models]
+    for spec in specs:
+        if multi_head and len(multi_head_specs) > 1 and spec in multi_head_specs:
+            if spec == multi_head_specs[0]:
+                runs.append(multi_head_specs)
+        else:
+            runs.append([spec])
+
+    return runs
+
+
+def load_run(run, precision="fp32", calibration_dir=None, compiled=False, mmap=False):
+    """
+    Load the model computing a run returned by ensemble_runs.
+    """
+    if len(run) > 1:
+        return load_multi_head(run, precision, calibration_dir, compiled, mmap)
+    return load_model(run[0][0], run[0][1], precision, calibration_dir, compiled, mmap)
+
+
+def load_ensemble(
+    specs=None,
+    multi_head=False,
+    precision="fp32",
+    calibration_dir=None,
+    compiled=False,
+    mmap=False,
+):
+    """
+    Load every model needed by iter_counts_ensemble for the given specs, e.g. when a worker starts.
+    :return: List of loaded models.
+    """
+    if specs is None:
+        specs = ensemble_specs()
+
+    return [
+        load_run(run, precision, calibration_dir, compiled, mmap)
+        for run in ensemble_runs(specs, multi_head)
+    ]
+
+
+def iter_counts_ensemble(
+    img_path,
+    specs=None,
+    is_gray=False,
+    resize_img=True,
+    multi_head=False,
+    cache=None,
+    tile_size=None,
+    tile_overlap=128,
+    precision="fp32",
+    calibration_dir=None,
+    compiled=False,
+    mmap=False,
+):
+    """
+    Run several models on one image, decoding it once and normalizing it once per preprocessing scheme.
+    Results are yielded as soon as each model finishes.
+    :param img_path: String (path to the image).
+    :param specs: List of (model_name, model_weights) tuples. Default: every available combination.
+    :param is_gray: Is the input image grayscale? Default: False.
+    :param resize_img: Should images with high resolution be down-scaled? Default: True
+    :param multi_head: Run all Bay / DM-Count checkpoints as one multi-head model, see ensemble_runs. Default: False
+    :param cache: Possible ResultCache, cached results are yielded without running the model. Default: None.
+    :param tile_size: Run the image on overlapping tiles of at most this size, see get_count. Default: None (no tiling)
+    :param tile_overlap: Overlap of neighbouring tiles in pixels. Default: 128
+    :param precision: "fp32", "bf16" or "int8", see load_model. Default: "fp32"
+    :param calibration_dir: Directory with sample crowd images to calibrate the int8 models on. Default: None.
+    :param compiled: Use TorchScript artifacts cached under ~/.lwcc/compiled. Default: False
+    :param mmap: Memory-map the weights, see load_model. Default: False
+    :return: Generator of (model_name, model_weights, count, density_map) tuples.
+    """
+    if specs is None:
+        specs = ensemble_specs()
+
+    runs = ensemble_runs(specs, multi_head)
+
+    if cache is not None:
+        image_hash = cache.image_hash(img_path)
+        keys = {
+            spec: cache_key(
+                cache,
+                image_hash,
+                spec[0],
+                spec[1],
+                resize_img,
+                is_gray,
+                tile_size,
+                tile_overlap,
+                precision,
+            )
+            for spec in specs
+        }
+
+        # yield everything that is cached, only the runs with a miss are computed
+        missing_runs = []
+        for run in runs:
+            cached = [cache.get(keys[spec]) for spec in run]
+            if any(result is None for result in cached):
+                missing_runs.append(run)
+                continue
+            for (model_name, model_weights), (count, density) in zip(run, cached):
+                yield model_name, model_weights, count, density
+        runs = missing_runs
+
+    # the image is only decoded if something has to be computed
+    img = None
+    inputs = {}
+
+    for run in runs:
+        if img is None:
+            img = read_image(img_path, resize_img)
+        key = preprocess_key(run[0][0], is_gray)
+        if key not in inputs:
+            inputs[key] = transform_image(img, run[0][0], is_gray)
+
+        model = load_run(run, precision, calibration_dir, compiled, mmap)
+        with torch.set_grad_enabled(False), precision_context(precision):
+            if tile_size:
+                outputs = tiled_forward(model, inputs[key], tile_size, tile_overlap)
+            else:
+                outputs = model(inputs[key])
+        outputs = outputs.float()
+
+        for i, (model_name, model_weights) in enumerate(run):
+            count = torch.sum(outputs[0, i]).item()
+            density = outputs[0, i, :, :].numpy()
+            if cache is not None:
+                cache.put(keys[(model_name, model_weights)], count, density)
+            yield model_name, model_weights, count, density
+
+
+def get_counts_ensemble(
+    img_path,
+    specs=None,
+    is_gray=False,
+    resize_img=True,
+    multi_head=False,
+    cache=None,
+    tile_size=None,
+    tile_overlap=128,
+    precision="fp32",
+    calibration_dir=None,
+    compiled=False,
+    mmap=False,
+):
+    """
+    Return the counts of several models on one image. See iter_counts_ensemble for the parameters.
+    :return: Tuple (count_dictionary, density_dictionary) keyed by (model_name, model_weights).
+    """
+    counts, densities = {}, {}
+
+    for model_name, model_weights, count, density in iter_counts_ensemble(
+        img_path,
+        specs,
+        is_gray,
+        resize_img,
+        multi_head,
+        cache,
+        tile_size,
+        tile_overlap,
+        precision,
+        calibration_dir,
+        compiled,
+        mmap,
+    ):
+        counts[(model_name, model_weights)] = count
+        densities[(model_name, model_weights)] = density
+
+    return counts, densities
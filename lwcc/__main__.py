@@ -0,0 +1,232 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from .LWCC import available_models, ensemble_specs, iter_counts
+from .util.precision import available_precisions, precision_report
+from .util.streaming import find_images
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m lwcc", description="LWCC crowd counting tools."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser(
+        "report",
+        help="Compare the counts and speed of reduced precision models with fp32",
+    )
+    report_parser.add_argument(
+        "image_dir", help="Directory with the images to compare on"
+    )
+    report_parser.add_argument(
+        "--calibration-dir",
+        help="Directory with the int8 calibration images (default: image_dir)",
+    )
+    report_parser.add_argument(
+        "--models", nargs="+", help="Models to compare (default: all)"
+    )
+    report_parser.add_argument(
+        "--weights", nargs="+", help="Weights to compare (default: all)"
+    )
+    report_parser.add_argument(
+        "--precisions",
+        nargs="+",
+        choices=available_precisions,
+        default=available_precisions,
+    )
+    report_parser.add_argument(
+        "--no-resize", action="store_true", help="Count the images at full resolution"
+    )
+    report_parser.set_defaults(func=report)
+
+    count_parser = subparsers.add_parser(
+        "count", help="Count the people on every image of a directory or glob pattern"
+    )
+    count_parser.add_argument(
+        "images", help="Directory (searched recursively) or glob pattern of the images"
+    )
+    count_parser.add_argument(
+        "-o", "--output", help="File to write the counts to (default: stdout)"
+    )
+    count_parser.add_argument(
+        "--format",
+        choices=["jsonl", "csv"],
+        help="Output format (default: from the output extension, jsonl otherwise)",
+    )
+    count_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the images already in the output file and append to it",
+    )
+    count_parser.add_argument(
+        "--model", choices=list(available_models.keys()), default="CSRNet"
+    )
+    count_parser.add_argument("--weights", default="SHA")
+    count_parser.add_argument(
+        "--precision", choices=available_precisions, default="fp32"
+    )
+    count_parser.add_argument(
+        "--calibration-dir", help="Directory with the int8 calibration images"
+    )
+    count_parser.add_argument(
+        "--compiled", action="store_true", help="Run the model as TorchScript"
+    )
+    count_parser.add_argument(
+        "--no-resize", action="store_true", help="Count the images at full resolution"
+    )
+    count_parser.add_argument(
+        "--tile-size", type=int, help="Count images larger than this on tiles"
+    )
+    count_parser.add_argument("--batch-size", type=int, default=8)
+    count_parser.add_argument(
+        "--max-pixels",
+        type=int,
+        default=8 * 1000**2,
+        help="Maximum number of pixels in a batch, larger images run on their own (default: 8 megapixels)",
+    )
+    count_parser.add_argument(
+        "--workers", type=int, default=4, help="Image decoding threads"
+    )
+    count_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=16,
+        help="Images decoded ahead of the model and batched together, about twice as many are held in "
+        "memory (default: 16)",
+    )
+    count_parser.set_defaults(func=count)
+
+    return parser
+
+
+def report(args):
+    rows = precision_report(
+        ensemble_specs(args.models, args.weights),
+        args.image_dir,
+        calibration_dir=args.calibration_dir,
+        precisions=args.precisions,
+        resize_img=not args.no_resize,
+    )
+
+    print(
+        "{:<10} {:<8} {:<9} {:>10} {:>8} {:>12} {:>10}".format(
+            "model",
+            "weights",
+            "precision",
+            "s/image",
+            "speedup",
+            "abs error",
+            "rel error",
+        )
+    )
+    for row in rows:
+        print(
+            "{model_name:<10} {model_weights:<8} {precision:<9} {seconds:>10.3f} {speedup:>7.2f}x "
+            "{mean_abs_error:>12.2f} {mean_rel_error:>9.2%}".format(**row)
+        )
+
+
+fields = ["path", "count", "error"]
+
+
+def output_format(args):
+    if args.format:
+        return args.format
+    if args.output and args.output.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def read_done(path, format):
+    """
+    Paths already in an output file. A last line cut off by an interrupted run is removed from the file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    complete = data[: data.rfind(b"\n") + 1]
+    if len(complete) != len(data):
+        with open(path, "wb") as f:
+            f.write(complete)
+
+    lines = complete.decode("utf-8").splitlines()
+    if format == "csv":
+        rows = csv.DictReader(lines)
+    else:
+        rows = (json.loads(line) for line in lines if line)
+
+    # images that failed are tried again
+    return {row["path"] for row in rows if not row["error"]}
+
+
+def count(args):
+    format = output_format(args)
+
+    done = set()
+    if args.resume:
+        if not args.output:
+            raise SystemExit("--resume needs an --output file")
+        if os.path.isfile(args.output):
+            done = read_done(args.output, format)
+
+    img_paths = [path for path in find_images(args.images) if path not in done]
+    print(
+        "Counting {} images, {} already done".format(len(img_paths), len(done)),
+        file=sys.stderr,
+    )
+
+    if args.output:
+        new_file = not os.path.isfile(args.output) or not args.resume
+        out = open(args.output, "a" if args.resume else "w", newline="")
+    else:
+        new_file = True
+        out = sys.stdout
+
+    writer = csv.DictWriter(out, fields) if format == "csv" else None
+    if writer and new_file:
+        writer.writeheader()
+
+    results = iter_counts(
+        img_paths,
+        args.model,
+        args.weights,
+        resize_img=not args.no_resize,
+        tile_size=args.tile_size,
+        max_batch_size=args.batch_size,
+        max_pixels=args.max_pixels,
+        precision=args.precision,
+        calibration_dir=args.calibration_dir,
+        compiled=args.compiled,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+
+    try:
+        for img_path, img_count, error in results:
+            row = {
+                "path": img_path,
+                "count": img_count,
+                "error": str(error) if error else None,
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + "\n")
+            # every written row is a checkpoint for --resume
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,21 @@
-from ..util.functions import weights_check
+from ..util.functions import load_weights
 
 import torch.nn as nn
 import torch
 
+available_weights = ["SHA", "SHB"]
 
-def make_model(model_weights):
-    available_weights = ["SHA", "SHB"]
 
+def make_model(model_weights, mmap=False):
     if model_weights not in available_weights:
         raise ValueError(
             "Weights {} not available for CSRNet. Available weights: {}".format(
                 model_weights, available_weights
             )
         )
-    output = weights_check("CSRNet", model_weights)
 
     model = CSRNet()
-    model.load_state_dict(torch.load(output, map_location="cpu")["model"])
+    load_weights(model, "CSRNet", model_weights, mmap)
 
     return model
 
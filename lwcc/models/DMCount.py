@@ -1,22 +1,21 @@
-from ..util.functions import weights_check
+from ..util.functions import load_weights
 
 import torch.nn as nn
 import torch
 
+available_weights = ["SHA", "SHB", "QNRF"]
 
-def make_model(model_weights):
-    available_weights = ["SHA", "SHB", "QNRF"]
 
+def make_model(model_weights, mmap=False):
     if model_weights not in available_weights:
         raise ValueError(
             "Weights {} not available for CSRNet. Available weights: {}".format(
                 model_weights, available_weights
             )
         )
-    weights_path = weights_check("DM-Count", model_weights)
 
     model = VGG(make_layers(cfg["E"]))
-    model.load_state_dict(torch.load(weights_path, map_location="cpu")["model"])
+    load_weights(model, "DM-Count", model_weights, mmap)
 
     return model
 
@@ -0,0 +1,117 @@
+from . import Bay, DMCount
+from ..util.functions import mmap_weights_check, load_mmap_state_dict
+
+import torch.nn as nn
+import torch
+
+available_models = {
+    "Bay": Bay,
+    "DM-Count": DMCount,
+}
+
+
+def make_model(specs, mmap=False):
+    """
+    Builds one multi-head model out of several Bay / DM-Count checkpoints.
+    :param specs: List of (model_name, model_weights) tuples, model_name is either "Bay" or "DM-Count".
+    :param mmap: Memory-map the stacked weights, see load_weights. Default: False
+    :return: MultiHeadVGG whose output channel i is the density map of specs[i].
+    """
+    models = []
+    for model_name, model_weights in specs:
+        model = available_models.get(model_name)
+        if not model:
+            raise ValueError(
+                "Model {} can not be part of a multi-head model. Available models: {}".format(
+                    model_name, list(available_models.keys())
+                )
+            )
+        models.append(model.make_model(model_weights, mmap))
+
+    model = MultiHeadVGG(models)
+
+    if mmap:
+        # the stacked weights are new tensors, map them from their own file
+        path = mmap_weights_check(
+            "MultiHead_{}.mmap.pt".format(
+                "+".join("{}_{}".format(*spec) for spec in specs)
+            ),
+            model.state_dict,
+        )
+        load_mmap_state_dict(model, path)
+
+    return model
+
+
+class MultiHeadVGG(nn.Module):
+    """
+    Bay and DM-Count share the VGG19 topology and only differ in their weights and heads, so N of them
+    can run as one network: the first convolution is widened to N * 64 output channels and every later
+    convolution becomes a grouped convolution with N groups.
+    """
+
+    def __init__(self, models):
+        super(MultiHeadVGG, self).__init__()
+        self.names = [model.get_name() for model in models]
+
+        features = []
+        grouped = False
+        for layers in zip(*[model.features for model in models]):
+            if isinstance(layers[0], nn.Conv2d):
+                features.append(stack_convs(layers, grouped))
+                grouped = True
+            else:
+                features.append(layers[0])
+        self.features = nn.Sequential(*features)
+
+        heads = [head_convs(model) for model in models]
+        self.reg_layer = nn.Sequential(
+            stack_convs([convs[0] for convs in heads], True),
+            nn.ReLU(inplace=True),
+            stack_convs([convs[1] for convs in heads], True),
+            nn.ReLU(inplace=True),
+            stack_convs([convs[2] for convs in heads], True),
+        )
+
+        # Bay takes the absolute value of its output, DM-Count a ReLU
+        self.register_buffer(
+            "use_abs",
+            torch.tensor([name == "Bay" for name in self.names]).view(1, -1, 1, 1),
+        )
+
+    def get_name(self):
+        return "MultiHead"
+
+    def forward(self, x):
+        x = self.features(x)
+        x = nn.functional.interpolate(
+            x, scale_factor=2, mode="bilinear", align_corners=True
+        )
+        x = self.reg_layer(x)
+        return torch.where(self.use_abs, torch.abs(x), torch.relu(x))
+
+
+def head_convs(model):
+    if model.get_name() == "Bay":
+        return [model.reg_layer[0], model.reg_layer[2], model.reg_layer[4]]
+    return [model.reg_layer[0], model.reg_layer[2], model.density_layer[0]]
+
+
+def stack_convs(convs, grouped):
+    """
+    Stack N convolutions with the same shape into one. If grouped, the input is expected to hold the
+    N inputs concatenated along the channel axis, otherwise all N convolutions read the same input.
+    """
+    conv = convs[0]
+    groups = len(convs) if grouped else 1
+    stacked = nn.Conv2d(
+        conv.in_channels * groups,
+        conv.out_channels * len(convs),
+        kernel_size=conv.kernel_size,
+        padding=conv.padding,
+        groups=groups,
+    )
+    stacked.weight.data = torch.cat([c.weight.data for c in convs])
+    stacked.bias.data = torch.cat([c.bias.data for c in convs])
+
+    return stacked
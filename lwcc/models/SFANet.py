@@ -1,22 +1,21 @@
-from ..util.functions import weights_check
+from ..util.functions import load_weights
 
 import torch
 from torch import nn
 
+available_weights = ["SHB"]
 
-def make_model(model_weights):
-    available_weights = ["SHB"]
 
+def make_model(model_weights, mmap=False):
     if model_weights not in available_weights:
         raise ValueError(
             "Weights {} not available for CSRNet. Available weights: {}".format(
                 model_weights, available_weights
             )
         )
-    weights_path = weights_check("SFANet", model_weights)
 
     model = SFANet()
-    model.load_state_dict(torch.load(weights_path, map_location="cpu")["model"])
+    load_weights(model, "SFANet", model_weights, mmap)
 
     return model
 
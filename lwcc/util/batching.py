@@ -0,0 +1,117 @@
+import math
+
+import torch
+
+# inputs are padded to a multiple of the largest down-sampling factor of the models
+ALIGN = 16
+
+# down-sampling factor of the backbone of the models, when it is not ALIGN
+BLOCKS = {"CSRNet": 8}
+
+
+def make_batches(shapes, max_batch_size=8, max_pixels=None):
+    """
+    Group images of different sizes into batches. Images are bucketed by aspect ratio and sorted by size,
+    so little padding is needed to stack a batch into one tensor.
+    :param shapes: List of (height, width) of the images.
+    :param max_batch_size: Maximum number of images in a batch. Default: 8
+    :param max_pixels: Maximum number of (padded) pixels in a batch, a larger image is still run on its own.
+            Default: None (no limit)
+    :return: List of batches, each batch is a list of indices into shapes.
+    """
+    buckets = {}
+    for i, (height, width) in enumerate(shapes):
+        # aspect ratios within ~20% of each other share a bucket
+        bucket = round(math.log2(width / height) * 4)
+        buckets.setdefault(bucket, []).append(i)
+
+    batches = []
+    for bucket in sorted(buckets):
+        indices = sorted(buckets[bucket], key=lambda i: shapes[i][0] * shapes[i][1])
+
+        batch, batch_height, batch_width = [], 0, 0
+        for i in indices:
+            height = max(batch_height, padded(shapes[i][0]))
+            width = max(batch_width, padded(shapes[i][1]))
+            too_many = max_batch_size and len(batch) >= max_batch_size
+            too_large = max_pixels and (len(batch) + 1) * height * width > max_pixels
+            if batch and (too_many or too_large):
+                batches.append(batch)
+                batch = []
+                height, width = padded(shapes[i][0]), padded(shapes[i][1])
+            batch.append(i)
+            batch_height, batch_width = height, width
+        if batch:
+            batches.append(batch)
+
+    return batches
+
+
+def padded(length):
+    return math.ceil(length / ALIGN) * ALIGN
+
+
+def pad_batch(imgs):
+    """
+    Stack images of shape (1, 3, h, w) into one zero padded tensor.
+    :return: Tensor of shape (B, 3, H, W) with H and W multiples of 16.
+    """
+    height = padded(max(img.shape[2] for img in imgs))
+    width = padded(max(img.shape[3] for img in imgs))
+
+    batch = imgs[0].new_zeros(len(imgs), imgs[0].shape[1], height, width)
+    for i, img in enumerate(imgs):
+        batch[i, :, : img.shape[2], : img.shape[3]] = img[0]
+
+    return batch
+
+
+def unpad_outputs(outputs, imgs, batch, block=ALIGN):
+    """
+    Crop the padded regions out of the density maps, so they do not count.
+    :param outputs: Model output of shape (B, C, h, w) for the padded batch.
+    :param imgs: The unpadded images the batch was built from.
+    :param batch: The padded batch.
+    :param block: Down-sampling factor of the backbone of the model. Default: 16
+    :return: List of density maps of shape (1, C, h_i, w_i).
+    """
+    scale = max(1, round(batch.shape[2] / outputs.shape[2]))
+
+    # keep the cells computed from the part of the image that fills whole blocks, the same region
+    # the model covers when it runs on the image alone
+    return [
+        outputs[
+            i : i + 1,
+            :,
+            : max(1, (img.shape[2] // block) * block // scale),
+            : max(1, (img.shape[3] // block) * block // scale),
+        ]
+        for i, img in enumerate(imgs)
+    ]
+
+
+def batched_forward(model, imgs, max_batch_size=8, max_pixels=None):
+    """
+    Run the model on images of different sizes, one forward pass per batch.
+    :param model: Crowd counting model.
+    :param imgs: List of tensors of shape (1, 3, h, w).
+    :return: List of density maps of shape (1, C, h_i, w_i), in the order of imgs.
+    """
+    outputs = [None] * len(imgs)
+
+    for indices in make_batches(
+        [(img.shape[2], img.shape[3]) for img in imgs], max_batch_size, max_pixels
+    ):
+        batch_imgs = [imgs[i] for i in indices]
+        if all(img.shape == batch_imgs[0].shape for img in batch_imgs):
+            # nothing to pad, keep the exact output of the unbatched model
+            batch_outputs = torch.split(model(torch.cat(batch_imgs)), 1)
+        else:
+            batch = pad_batch(batch_imgs)
+            batch_outputs = unpad_outputs(
+                model(batch), batch_imgs, batch, BLOCKS.get(model.get_name(), ALIGN)
+            )
+        for i, output in zip(indices, batch_outputs):
+            outputs[i] = output
+
+    return outputs
@@ -0,0 +1,132 @@
+from pathlib import Path
+import hashlib
+import os
+import uuid
+
+import numpy as np
+
+# once over max_bytes a cache is trimmed to this fraction of it, so the next writes do not scan it again
+LOW_WATERMARK = 0.9
+
+
+class FileCache:
+    """
+    Directory of cache entries named <key><suffix>, which can be shared by several processes. The least
+    recently used entries are deleted once the cache grows over max_bytes. The size of the cache is counted
+    by scanning the directory once, then adding the entries this process writes; the entries of other
+    processes are counted at its next scan.
+    """
+
+    def __init__(self, directory, suffix, max_bytes):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, "{}{}".format(key, self.suffix))
+
+    def contains(self, key):
+        return os.path.isfile(self.path(key))
+
+    @staticmethod
+    def touch(path):
+        # the modification time orders the entries for eviction
+        os.utime(path)
+
+    def write(self, key, write):
+        """
+        Store an entry, written by write(file) next to it and renamed so readers never see a partial entry.
+        """
+        path = self.path(key)
+        tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        with open(tmp_path, "wb") as f:
+            write(f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        if self.total_bytes is None:
+            self.evict()
+        else:
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Scan the directory for the size of the cache, and if it is over max_bytes delete the least recently
+        used entries until it is under LOW_WATERMARK * max_bytes.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= LOW_WATERMARK * self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self.total_bytes = total
+
+
+class ResultCache(FileCache):
+    """
+    Persistent cache of predicted counts and density maps, keyed by the content of the image and the
+    settings of the prediction. Entries are compressed .npz files, see FileCache for the eviction.
+    """
+
+    def __init__(self, directory=None, max_bytes=1024**3):
+        if directory is None:
+            directory = os.path.join(str(Path.home()), ".lwcc/cache")
+        super(ResultCache, self).__init__(directory, ".npz", max_bytes)
+
+    @staticmethod
+    def image_hash(img_path):
+        """
+        SHA-256 of the image file.
+        """
+        digest = hashlib.sha256()
+        with open(img_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(image_hash, *settings):
+        """
+        Cache key for an image hash and the settings of the prediction, e.g. model name, weights, resize_img
+        and is_gray.
+        """
+        return hashlib.sha256(repr((image_hash,) + settings).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        :return: Tuple (count, density_map) or None if the key is not cached.
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                count, density = float(entry["count"]), entry["density"]
+            self.touch(path)
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+
+        return count, density
+
+    def put(self, key, count, density):
+        self.write(
+            key,
+            lambda f: np.savez_compressed(f, count=np.float64(count), density=density),
+        )
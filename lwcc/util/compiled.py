@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from pathlib import Path
+import logging
+import math
+import os
+import uuid
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+
+def compiled_dir():
+    home = str(Path.home())
+    directory = os.path.join(home, ".lwcc/compiled")
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+class CompiledModel(nn.Module):
+    """
+    TorchScript version of a model. For every input-shape bucket the model is traced and frozen once, which
+    folds the batch norms into the convolutions, and saved under ~/.lwcc/compiled. Later processes load the
+    saved artifacts and only build the eager model if a bucket is missing.
+    Traced graphs accept any input shape, keeping one graph per bucket stops the JIT from re-specializing a
+    single graph every time the shape changes. Every graph holds its own copy of the frozen weights, so
+    buckets are loaded when an input needs them and only the max_buckets most recently used stay in memory.
+    """
+
+    def __init__(self, model_full_name, name, load_eager, bucket=256, max_buckets=2):
+        """
+        :param model_full_name: Unique name of the model and its weights, used to name the artifacts.
+        :param name: Name returned by get_name, e.g. "CSRNet".
+        :param load_eager: Function building a new eager model, only called when an artifact has to be built.
+            The eager model is dropped once it is traced.
+        :param bucket: Height and width of the input are rounded up to a multiple of bucket. Default: 256
+        :param max_buckets: Number of compiled graphs kept in memory. Default: 2
+        """
+        super(CompiledModel, self).__init__()
+        self.model_full_name = model_full_name
+        self.name = name
+        self.load_eager = load_eager
+        self.bucket = bucket
+        self.max_buckets = max_buckets
+        self.modules_by_bucket = OrderedDict()
+
+    def get_name(self):
+        return self.name
+
+    def nbytes(self):
+        # the frozen weights are constants of the graphs, a loaded bucket takes about the size of its artifact.
+        # Count as many as can be loaded at once, the registry measures a model before it has run.
+        prefix = self.artifact_prefix()
+        with os.scandir(compiled_dir()) as it:
+            sizes = [
+                entry.stat().st_size
+                for entry in it
+                if entry.name.startswith(prefix) and entry.name.endswith(".pt")
+            ]
+        return max(sizes, default=0) * self.max_buckets
+
+    def artifact_prefix(self):
+        # artifacts are not portable between torch versions
+        return "{}_torch{}_".format(self.model_full_name, torch.__version__)
+
+    def artifact_path(self, shape):
+        return os.path.join(
+            compiled_dir(), "{}{}x{}.pt".format(self.artifact_prefix(), *shape)
+        )
+
+    @staticmethod
+    def load_artifact(path):
+        module = torch.jit.load(path, map_location="cpu")
+        # the mkldnn rewrites are not serializable, apply them after loading
+        return torch.jit.optimize_for_inference(module)
+
+    def compile(self, x, shape):
+        path = self.artifact_path(shape)
+        with torch.set_grad_enabled(False):
+            module = torch.jit.freeze(torch.jit.trace(self.load_eager(), x))
+
+        tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        torch.jit.save(module, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(
+            "Compiled model %s for inputs up to %dx%d", self.model_full_name, *shape
+        )
+
+    def module(self, x, shape):
+        if shape in self.modules_by_bucket:
+            self.modules_by_bucket.move_to_end(shape)
+            return self.modules_by_bucket[shape]
+
+        path = self.artifact_path(shape)
+        if not os.path.isfile(path):
+            self.compile(x, shape)
+        module = self.load_artifact(path)
+
+        self.modules_by_bucket[shape] = module
+        while len(self.modules_by_bucket) > self.max_buckets:
+            evicted, _ = self.modules_by_bucket.popitem(last=False)
+            logger.info(
+                "Unloaded model %s for inputs up to %dx%d",
+                self.model_full_name,
+                *evicted
+            )
+        return module
+
+    def forward(self, x):
+        shape = (
+            math.ceil(x.shape[2] / self.bucket) * self.bucket,
+            math.ceil(x.shape[3] / self.bucket) * self.bucket,
+        )
+        return self.module(x, shape)(x)
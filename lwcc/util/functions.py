@@ -1,10 +1,16 @@
 from pathlib import Path
 import gdown
+import logging
 import os
+import uuid
+
+import numpy as np
+import torch
 
-from torchvision import transforms
 from PIL import Image
 
+logger = logging.getLogger(__name__)
+
 
 def build_url(path):
     url = (
@@ -24,56 +30,153 @@ def weights_check(model_name, model_weights):
     file_name = "{}_{}.pth".format(model_name, model_weights)
     url = build_url(file_name)
     output = os.path.join(home, ".lwcc/weights/", file_name)
-    print(output)
+    logger.debug("Weights %s", output)
 
     if not os.path.isfile(output):
-        print(file_name, " will be downloaded to ", output)
+        logger.info("%s will be downloaded to %s", file_name, output)
         gdown.download(url, output, quiet=False)
 
     return output
 
 
+def mmap_weights_check(file_name, load_state_dict):
+    """
+    Path of a copy of a state dict in torch's zip format under ~/.lwcc/weights, which torch.load can memory-map.
+    The copy is written the first time it is needed.
+    :param file_name: Name of the copy.
+    :param load_state_dict: Function returning the state dict.
+    """
+    home = str(Path.home())
+
+    Path(os.path.join(home, ".lwcc/weights")).mkdir(parents=True, exist_ok=True)
+
+    output = os.path.join(home, ".lwcc/weights/", file_name)
+
+    if not os.path.isfile(output):
+        # write to a temporary file first, other processes may be converting the same weights
+        tmp_output = "{}.{}.tmp".format(output, uuid.uuid4().hex)
+        torch.save(load_state_dict(), tmp_output)
+        os.replace(tmp_output, output)
+
+    return output
+
+
+def load_mmap_state_dict(model, path):
+    """
+    Load a state dict written by mmap_weights_check into the model without copying it. The parameters stay backed
+    by the file, so every process mapping it shares the same read-only pages.
+    """
+    state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, assign=True)
+
+
+def load_weights(model, model_name, model_weights, mmap=False):
+    """
+    Initialize the model with its pretrained weights, downloading them if needed.
+    :param mmap: Memory-map the weights instead of reading them into the memory of the process. Default: False
+    """
+    if mmap:
+        path = mmap_weights_check(
+            "{}_{}.mmap.pt".format(model_name, model_weights),
+            lambda: torch.load(
+                weights_check(model_name, model_weights), map_location="cpu"
+            )["model"],
+        )
+        load_mmap_state_dict(model, path)
+    else:
+        weights_path = weights_check(model_name, model_weights)
+        model.load_state_dict(torch.load(weights_path, map_location="cpu")["model"])
+
+
 def load_image(img_path, model_name, is_gray=False, resize_img=True):
+    img = read_image(img_path, resize_img, model_name)
+    img = transform_image(img, model_name, is_gray)
+
+    name = os.path.basename(img_path).split(".")[0]
+
+    return img, name
+
+
+def read_image(img_path, resize_img=True, model_name=None):
+    """
+    Decode an image from disk and optionally down-scale it. Without model_name the result can be shared by every
+    model, with it the resizes of the model are done here in a single step.
+    :param img_path: Path to the image.
+    :param resize_img: Should the long side of the image be rescaled to 1000px? Default: True
+    :param model_name: Name of the model the image is for. Default: None
+    :return: RGB PIL image.
+    """
     if not os.path.isfile(img_path):
         raise ValueError("Confirm that {} exists".format(img_path))
 
-    # set transform
-    if is_gray:
-        trans = transforms.Compose(
-            [
-                transforms.ToTensor(),
-                transforms.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
-            ]
-        )
-    else:
-        trans = transforms.Compose(
-            [
-                transforms.ToTensor(),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-            ]
-        )
+    img = Image.open(img_path)
+    size = image_size(img.size, resize_img, model_name)
+
+    # let the JPEG decoder scale the image down by up to 8x in the DCT domain, it never goes below size
+    if size != img.size:
+        img.draft("RGB", size)
 
-    # preprocess image
-    img = Image.open(img_path).convert("RGB")
+    img = img.convert("RGB")
+    if size != img.size:
+        img = img.resize(size, Image.BILINEAR)
+
+    return img
+
+
+def image_size(size, resize_img=True, model_name=None):
+    """
+    Size (width, height) an image of the given size is resized to before it is turned into a tensor.
+    """
+    width, height = size
 
-    # resize image
     if resize_img:
-        long = max(img.size[0], img.size[1])
-        factor = 1000 / long
-        img = img.resize(
-            (int(img.size[0] * factor), int(img.size[1] * factor)), Image.BILINEAR
-        )
+        factor = 1000 / max(width, height)
+        width, height = int(width * factor), int(height * factor)
 
-    # different preprocessing for SFANet
+    # SFANet needs sides divisible by 16
     if model_name == "SFANet":
-        height, width = img.size[1], img.size[0]
-        height = round(height / 16) * 16
-        width = round(width / 16) * 16
-        img = img.resize((width, height), Image.BILINEAR)
+        width, height = round(width / 16) * 16, round(height / 16) * 16
 
-    img = trans(img)
-    img = img.unsqueeze(0)
+    return width, height
 
-    name = os.path.basename(img_path).split(".")[0]
 
-    return img, name
+def preprocess_key(model_name, is_gray=False):
+    """
+    Models that share a key get an identical input tensor from transform_image.
+    """
+    return (model_name == "SFANet", is_gray)
+
+
+# ToTensor followed by Normalize folded into one multiply-add on the uint8 pixels: (x / 255 - mean) / std
+normalization = {
+    is_gray: (
+        (1 / (255 * torch.tensor(std))).view(3, 1, 1),
+        (-torch.tensor(mean) / torch.tensor(std)).view(3, 1, 1),
+    )
+    for is_gray, mean, std in [
+        (False, [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+        (True, [0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
+    ]
+}
+
+
+def transform_image(img, model_name, is_gray=False):
+    """
+    Turn a decoded image into a normalized input tensor for the given model.
+    :param img: RGB PIL image, as returned by read_image.
+    :param model_name: Name of the model the tensor is for.
+    :param is_gray: Is the input image grayscale? Default: False.
+    :return: Tensor of shape (1, 3, H, W).
+    """
+    size = image_size(img.size, False, model_name)
+    if size != img.size:
+        img = img.resize(size, Image.BILINEAR)
+
+    pixels = torch.from_numpy(np.array(img)).permute(2, 0, 1)
+    scale, offset = normalization[is_gray]
+
+    img = torch.empty((1, 3, img.size[1], img.size[0]))
+    torch.mul(pixels, scale, out=img[0])
+    img.add_(offset)
+
+    return img
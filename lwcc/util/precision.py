@@ -0,0 +1,172 @@
+from .functions import load_image
+
+import contextlib
+import copy
+import os
+import time
+
+import torch
+from torch import nn
+
+available_precisions = ["fp32", "bf16", "int8"]
+
+image_extensions = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def list_images(directory):
+    """
+    Sorted paths of the images in a directory.
+    """
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(image_extensions)
+    )
+
+
+def check_precision(precision):
+    if precision not in available_precisions:
+        raise ValueError(
+            "Precision {} not available. Available precisions: {}".format(
+                precision, available_precisions
+            )
+        )
+
+
+def precision_context(precision):
+    """
+    Context to run a forward pass in. bf16 runs fp32 weights under CPU autocast, int8 models are already
+    quantized and fp32 needs nothing.
+    """
+    check_precision(precision)
+
+    if precision == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+class QuantizedModel(nn.Module):
+    """
+    Wraps the quantized graph so it still answers get_name like the model it was built from.
+    """
+
+    def __init__(self, module, name):
+        super(QuantizedModel, self).__init__()
+        self.module = module
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+    def forward(self, x):
+        return self.module(x)
+
+
+def quantize(model, calibration_dir, max_images=32, is_gray=False, resize_img=True):
+    """
+    Post-training static int8 quantization of a model. Activation ranges are calibrated on the crowd images
+    in calibration_dir, the input model is not modified.
+    :param model: Crowd counting model.
+    :param calibration_dir: Directory with sample crowd images similar to the ones the model will count.
+    :param max_images: Use at most this many images for calibration. Default: 32
+    :param is_gray: Are the calibration images grayscale? Default: False.
+    :param resize_img: Resize the calibration images like get_count does? Default: True
+    :return: Quantized model.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    img_paths = list_images(calibration_dir)[:max_images]
+    if not img_paths:
+        raise ValueError("No calibration images found in {}".format(calibration_dir))
+
+    name = model.get_name()
+    model = copy.deepcopy(model).eval()
+
+    imgs = [
+        load_image(img_path, name, is_gray, resize_img)[0] for img_path in img_paths
+    ]
+
+    prepared = prepare_fx(
+        model, get_default_qconfig_mapping("x86"), example_inputs=(imgs[0],)
+    )
+    with torch.set_grad_enabled(False):
+        for img in imgs:
+            prepared(img)
+
+    return QuantizedModel(convert_fx(prepared), name)
+
+
+def precision_report(
+    specs,
+    image_dir,
+    calibration_dir=None,
+    precisions=None,
+    is_gray=False,
+    resize_img=True,
+):
+    """
+    Compare the counts and speed of reduced precision models with fp32.
+    :param specs: List of (model_name, model_weights) tuples.
+    :param image_dir: Directory with the images to compare on.
+    :param calibration_dir: Directory with the int8 calibration images. Default: image_dir
+    :param precisions: Precisions to compare. Default: all available precisions.
+    :return: List of dicts with model_name, model_weights, precision, seconds (per image), speedup, mean_abs_error
+        and mean_rel_error (both against the fp32 counts).
+    """
+    from ..LWCC import load_model
+
+    if precisions is None:
+        precisions = available_precisions
+    if calibration_dir is None:
+        calibration_dir = image_dir
+
+    img_paths = list_images(image_dir)
+    if not img_paths:
+        raise ValueError("No images found in {}".format(image_dir))
+
+    rows = []
+    for model_name, model_weights in specs:
+        imgs = [
+            load_image(img_path, model_name, is_gray, resize_img)[0]
+            for img_path in img_paths
+        ]
+
+        reference, reference_seconds = None, None
+        for precision in ["fp32"] + [p for p in precisions if p != "fp32"]:
+            model = load_model(
+                model_name,
+                model_weights,
+                precision=precision,
+                calibration_dir=calibration_dir,
+            )
+
+            counts = []
+            start = time.perf_counter()
+            with torch.set_grad_enabled(False), precision_context(precision):
+                for img in imgs:
+                    counts.append(torch.sum(model(img).float()).item())
+            seconds = (time.perf_counter() - start) / len(imgs)
+
+            if reference is None:
+                reference, reference_seconds = counts, seconds
+
+            errors = [abs(count - ref) for count, ref in zip(counts, reference)]
+            if precision in precisions:
+                rows.append(
+                    {
+                        "model_name": model_name,
+                        "model_weights": model_weights,
+                        "precision": precision,
+                        "seconds": seconds,
+                        "speedup": reference_seconds / seconds,
+                        "mean_abs_error": sum(errors) / len(errors),
+                        "mean_rel_error": sum(
+                            error / max(abs(ref), 1e-6)
+                            for error, ref in zip(errors, reference)
+                        )
+                        / len(errors),
+                    }
+                )
+
+    return rows
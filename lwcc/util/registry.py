@@ -0,0 +1,131 @@
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def model_nbytes(model):
+    """
+    Approximate memory used by a model: its parameters and buffers, or its own nbytes() if it has one.
+    """
+    if hasattr(model, "nbytes"):
+        return model.nbytes()
+
+    def tensors_nbytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.nelement() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(tensors_nbytes(v) for v in value)
+        return 0
+
+    # quantized models keep their weights in packed params, which only show up in the state dict
+    return sum(tensors_nbytes(value) for value in model.state_dict().values())
+
+
+class ModelRegistry:
+    """
+    Thread-safe cache of built models with least recently used eviction once the models use more than
+    max_bytes. Concurrent requests for the same model wait for a single build.
+    """
+
+    def __init__(self, max_bytes=None):
+        """
+        :param max_bytes: Memory budget of the models in bytes. The most recently used model is always kept,
+                even if it is larger than the budget. Default: None (no limit)
+        """
+        self.max_bytes = max_bytes
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        """
+        Return the model stored under key, building it with build() if it is not loaded.
+        """
+        with self.lock:
+            if key in self.models:
+                return self._hit(key)
+            build_lock = self.build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self.lock:
+                # another thread may have built it while we were waiting
+                if key in self.models:
+                    return self._hit(key)
+                self.misses += 1
+
+            start = time.perf_counter()
+            model = build()
+            nbytes = model_nbytes(model)
+            logger.info(
+                "Built model %s (%.1f MB) in %.2fs",
+                key,
+                nbytes / 1024**2,
+                time.perf_counter() - start,
+            )
+
+            with self.lock:
+                self.models[key] = (model, nbytes)
+                self.build_locks.pop(key, None)
+                self._evict()
+
+        return model
+
+    def _hit(self, key):
+        self.hits += 1
+        self.models.move_to_end(key)
+        return self.models[key][0]
+
+    def _evict(self):
+        while (
+            self.max_bytes is not None
+            and len(self.models) > 1
+            and self.nbytes() > self.max_bytes
+        ):
+            key, (_, nbytes) = self.models.popitem(last=False)
+            self.evictions += 1
+            logger.info("Evicted model %s (%.1f MB)", key, nbytes / 1024**2)
+
+    def nbytes(self):
+        return sum(nbytes for _, nbytes in self.models.values())
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def warm_up(self, loaders):
+        """
+        Preload models, e.g. when a worker starts, so the first request does not pay for the build.
+        :param loaders: List of functions loading models through this registry.
+        """
+        start = time.perf_counter()
+        for loader in loaders:
+            loader()
+        logger.info(
+            "Warmed up %d models (%.1f MB) in %.2fs",
+            len(self.models),
+            self.nbytes() / 1024**2,
+            time.perf_counter() - start,
+        )
+
+    def stats(self):
+        with self.lock:
+            return {
+                "models": len(self.models),
+                "nbytes": self.nbytes(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
@@ -0,0 +1,71 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+
+from .precision import image_extensions
+
+
+def find_images(pattern):
+    """
+    Sorted paths of the images in a directory and its subdirectories, or of the images matching a glob pattern
+    (** matches subdirectories).
+    """
+    if os.path.isdir(pattern):
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(pattern)
+            for name in names
+        ]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+
+    return sorted(path for path in paths if path.lower().endswith(image_extensions))
+
+
+def prefetch(func, items, workers=4, max_pending=None):
+    """
+    Apply func to items on a thread pool while the results are consumed. At most max_pending items are in
+    flight, so memory stays bounded however many items there are. PIL decoding releases the GIL, so
+    threads are enough.
+    :param func: Function of one item.
+    :param items: Iterable of items, read lazily.
+    :param workers: Number of threads. Default: 4
+    :param max_pending: Maximum number of submitted but not yet consumed items. Default: 4 * workers
+    :return: Generator of (item, result, error) tuples in the order of items, error is None on success.
+    """
+    if max_pending is None:
+        max_pending = 4 * workers
+
+    items = iter(items)
+    pending = deque()
+
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            for item in items:
+                pending.append((item, executor.submit(func, item)))
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                return
+
+            item, future = pending.popleft()
+            try:
+                yield item, future.result(), None
+            except Exception as error:
+                yield item, None, error
+
+
+def chunks(iterable, size):
+    """
+    Split an iterable into lists of at most size elements.
+    """
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,106 @@
+import torch
+
+from .batching import ALIGN, BLOCKS
+
+
+def tile_starts(length, tile_size, step):
+    """
+    Start offsets of the tiles along one axis. The last tile is moved back so it ends at the border, which
+    can make it up to ALIGN - 1 pixels longer than tile_size.
+    """
+    if length <= tile_size:
+        return [0]
+
+    starts = list(range(0, length - tile_size + 1, step))
+    last = ((length - tile_size) // ALIGN) * ALIGN
+    if starts[-1] != last:
+        starts.append(last)
+    return starts
+
+
+def ramp(length, overlap, leading, trailing):
+    """
+    1D blending weights of a tile in output resolution, fading in / out linearly over the overlap.
+    """
+    weights = torch.ones(length)
+    if overlap > 0:
+        fade = (torch.arange(overlap, dtype=torch.float32) + 0.5) / overlap
+        n = min(overlap, length)
+        if leading:
+            weights[:n] = torch.minimum(weights[:n], fade[:n])
+        if trailing:
+            weights[-n:] = torch.minimum(weights[-n:], fade[:n].flip(0))
+    return weights
+
+
+def tiled_forward(model, imgs, tile_size, tile_overlap=128):
+    """
+    Run the model on overlapping tiles of the input and blend the density maps on the seams, so the
+    memory used by the activations depends on tile_size instead of the size of the image.
+    :param model: Crowd counting model.
+    :param imgs: Tensor of shape (B, 3, H, W).
+    :param tile_size: Maximum height and width of a tile in pixels, rounded down to a multiple of 16.
+    :param tile_overlap: Overlap of neighbouring tiles in pixels, rounded down to a multiple of 16. Default: 128
+    :return: Density maps of shape (B, C, h, w), the same shape as calling the model on the whole input.
+    """
+    tile_size = (tile_size // ALIGN) * ALIGN
+    tile_overlap = (tile_overlap // ALIGN) * ALIGN
+    if tile_size <= tile_overlap:
+        raise ValueError(
+            "tile_size ({}) has to be larger than tile_overlap ({})".format(
+                tile_size, tile_overlap
+            )
+        )
+
+    height, width = imgs.shape[2], imgs.shape[3]
+    if height <= tile_size and width <= tile_size:
+        return model(imgs)
+
+    step = tile_size - tile_overlap
+    ys = tile_starts(height, tile_size, step)
+    xs = tile_starts(width, tile_size, step)
+
+    density, weight, scale = None, None, None
+
+    for i, y in enumerate(ys):
+        y_end = height if i == len(ys) - 1 else y + tile_size
+        for j, x in enumerate(xs):
+            x_end = width if j == len(xs) - 1 else x + tile_size
+
+            output = model(imgs[:, :, y:y_end, x:x_end])
+
+            if scale is None:
+                # output stride of the model, e.g. 8 for CSRNet and 2 for SFANet
+                scale = max(1, round((y_end - y) / output.shape[2]))
+                density = torch.zeros(
+                    output.shape[0], output.shape[1], height // scale, width // scale
+                )
+                weight = torch.zeros(height // scale, width // scale)
+
+            out_y, out_x = y // scale, x // scale
+            h, w = output.shape[2], output.shape[3]
+
+            # grow the canvas if the border tile produced a larger map than expected
+            if out_y + h > density.shape[2] or out_x + w > density.shape[3]:
+                grown_h = max(density.shape[2], out_y + h)
+                grown_w = max(density.shape[3], out_x + w)
+                density = torch.nn.functional.pad(
+                    density,
+                    (0, grown_w - density.shape[3], 0, grown_h - density.shape[2]),
+                )
+                weight = torch.nn.functional.pad(
+                    weight, (0, grown_w - weight.shape[1], 0, grown_h - weight.shape[0])
+                )
+
+            tile_weight = torch.outer(
+                ramp(h, tile_overlap // scale, i > 0, i < len(ys) - 1),
+                ramp(w, tile_overlap // scale, j > 0, j < len(xs) - 1),
+            )
+            density[:, :, out_y : out_y + h, out_x : out_x + w] += output * tile_weight
+            weight[out_y : out_y + h, out_x : out_x + w] += tile_weight
+
+    # the models only cover the part of the input that fills whole blocks, so does the tiled map
+    block = BLOCKS.get(model.get_name(), ALIGN)
+    out_h = max(1, (height // block) * block // scale)
+    out_w = max(1, (width // block) * block // scale)
+    return (density / weight.clamp(min=1e-6))[:, :, :out_h, :out_w]
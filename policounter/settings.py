@@ -132,3 +132,51 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Running estimation jobs whose worker has not reported progress for this many seconds are failed, the
+# worker is assumed dead. Must be longer than the slowest single model on the largest upload.
+ESTIMATE_JOB_TIMEOUT = 10 * 60
+
+# Cache of crowd estimates keyed by image content, None keeps it in ~/.lwcc/cache
+ESTIMATE_CACHE_DIR = None
+ESTIMATE_CACHE_MAX_BYTES = 2 * 1024**3
+
+# Full resolution uploads are counted on tiles of at most this many pixels per side to bound memory
+ESTIMATE_TILE_SIZE = 1024
+
+# Run the models as TorchScript artifacts cached in ~/.lwcc/compiled, built on first use. Every input size
+# bucket is a graph with its own copy of the weights, which costs more memory per worker than the eager
+# models (at most two buckets per model are kept loaded).
+ESTIMATE_COMPILED_MODELS = False
+
+# Run the Bay and DM-Count checkpoints as one multi-head model. Its grouped convolutions are slower than the
+# separate models on CPU, only worth it where they are fast (e.g. on a GPU).
+ESTIMATE_MULTI_HEAD = False
+
+# Memory-map the model weights so every worker process shares one copy. Compiled models hold their own
+# copy of the weights and do not use it.
+ESTIMATE_MMAP_WEIGHTS = False
+
+# Memory budget of the loaded models per process, least recently used models are dropped beyond it.
+# None keeps every model, which the full ensemble needs to avoid rebuilding models on every job.
+ESTIMATE_MODEL_MAX_BYTES = None
+
+# Build the ensemble when a worker starts instead of on its first job
+ESTIMATE_WARM_UP_MODELS = True
+
+# Event consensus: fraction of the lowest and highest counts left out of each group's trimmed mean, and
+# the weight of the human counts relative to the AI predictions (0 ignores them)
+CONSENSUS_TRIM = 0.2
+CONSENSUS_HUMAN_WEIGHT = 1.0
+
+# Location autocomplete of the add event form: default and largest number of matches, and how long
+# the matches of a query are cached, on the server and in the browser
+LOCATION_AUTOCOMPLETE_LIMIT = 10
+LOCATION_AUTOCOMPLETE_MAX_LIMIT = 50
+LOCATION_AUTOCOMPLETE_CACHE_SECONDS = 300
+
+# Flyers rendered by pollyvent's generate-flyer view, kept on disk up to FLYER_CACHE_MAX_BYTES and
+# cached by browsers and proxies for FLYER_CACHE_SECONDS
+FLYER_CACHE_DIR = os.path.join(MEDIA_ROOT, 'flyers')
+FLYER_CACHE_MAX_BYTES = 256 * 1024**2
+FLYER_CACHE_SECONDS = 24 * 60 * 60
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+# once over max_bytes the cache is trimmed to this fraction of it, so the next writes do not scan it again
+LOW_WATERMARK = 0.9
+
+
+class FlyerCache:
+    """
+    Rendered flyers on disk, shared by the server processes. Entries are named after the hash of everything
+    the flyer depends on, so they never go stale: changed inputs make a new key. The least recently used
+    entries are deleted once the cache grows over max_bytes. The size of the cache is counted by scanning
+    the directory once, then adding the flyers this process writes; the flyers of other processes are
+    counted at its next scan.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024**2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def contains(self, key):
+        return os.path.isfile(self.path(key))
+
+    def get(self, key):
+        """PNG bytes of the flyer, None if it is not cached"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # the modification time orders the entries for eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self.total_bytes is None:
+            self.evict()
+        else:
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Scan the directory for the size of the cache, and if it is over max_bytes delete the least recently
+        used entries until it is under LOW_WATERMARK * max_bytes
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".png"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= LOW_WATERMARK * self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self.total_bytes = total
@@ -1,3 +1,79 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from pollyvent import views
+from pollyvent.cache import FlyerCache
+
+FLYER = {"title": "March", "datetime": "2025-04-05T12:00", "location": "City Hall"}
+
+
+class FlyerCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = FlyerCache(directory.name, max_bytes=1000)
+
+    def test_least_recently_used_flyers_are_evicted(self):
+        for n, key in enumerate("abc"):
+            self.cache.put(key, b"x" * 300)
+            # mtimes can be equal within the filesystem's resolution
+            os.utime(self.cache.path(key), (n, n))
+        self.cache.get("a")
+        self.cache.put("d", b"x" * 300)
+
+        self.assertEqual([key for key in "abcd" if self.cache.contains(key)], ["a", "c", "d"])
+        self.assertEqual(self.cache.total_bytes, 900)
+
+    def test_size_is_counted_without_scanning(self):
+        self.cache.put("a", b"x" * 100)
+        with mock.patch.object(self.cache, "evict") as evict:
+            self.cache.put("b", b"x" * 100)
+        evict.assert_not_called()
+        self.assertEqual(self.cache.total_bytes, 200)
+
+
+class FlyerViewTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = FlyerCache(directory.name)
+        patcher = mock.patch.object(views, "flyer_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flyer_is_rendered_once(self):
+        with mock.patch.object(views, "render_flyer", wraps=views.render_flyer) as render:
+            first = self.client.get("/generate-flyer/", FLYER)
+            second = self.client.get("/generate-flyer/", FLYER)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first["Content-Type"], "image/png")
+        self.assertEqual(first.content, second.content)
+        self.assertTrue(self.cache.contains(views.flyer_key(first.wsgi_request)))
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get("/generate-flyer/", FLYER)["ETag"]
+
+        response = self.client.get("/generate-flyer/", FLYER, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        other = self.client.get("/generate-flyer/", {**FLYER, "title": "Rally"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+
+    def test_template_changes_are_not_hidden_by_if_modified_since(self):
+        first = self.client.get("/generate-flyer/", FLYER)
+        self.assertNotIn("Last-Modified", first)
+
+        with mock.patch.object(views, "TEMPLATE_VERSION", "next"):
+            response = self.client.get(
+                "/generate-flyer/", FLYER, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_parameters(self):
+        response = self.client.get("/generate-flyer/", {"title": "March"})
+        self.assertEqual(response.status_code, 400)
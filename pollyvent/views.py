@@ -1,8 +1,12 @@
 # pollyvent/views.py
+import io
 import os
+from datetime import datetime
 from django.http import HttpResponse
-from pollyvent.yvent.generator import generate_flyer
-from tempfile import NamedTemporaryFile
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from pollyvent.cache import FlyerCache
+from pollyvent.yvent.generator import TEMPLATE_VERSION, render_flyer
 from django.conf import settings
 
 BASE_DIR = settings.BASE_DIR
@@ -10,28 +14,50 @@ BASE_DIR = settings.BASE_DIR
 logo_path = os.path.join(BASE_DIR, "pollyvent", "yvent", "assets", "flierlogo.png")
 font_path = os.path.join(BASE_DIR, "pollyvent", "yvent", "assets", "DejaVuSans.ttf")
 
+flyer_cache = FlyerCache(settings.FLYER_CACHE_DIR, settings.FLYER_CACHE_MAX_BYTES)
+
+def flyer_params(request):
+    """Flyer fields of the query string, None if one is missing or the datetime is not ISO 8601"""
+    params = {
+        "title": request.GET.get("title"),
+        "dt_str": request.GET.get("datetime"),
+        "location": request.GET.get("location"),
+        "qr_text": request.GET.get("qr_text") or "scan this",
+    }
+    if not all(params.values()):
+        return None
+    try:
+        datetime.fromisoformat(params["dt_str"])
+    except ValueError:
+        return None
+    return params
+
+def assets_mtime():
+    return max(os.stat(logo_path).st_mtime_ns, os.stat(font_path).st_mtime_ns)
+
+def flyer_key(request):
+    params = flyer_params(request)
+    if params is None:
+        return None
+    return FlyerCache.key(params, TEMPLATE_VERSION, assets_mtime())
+
+# no Last-Modified: a flyer also changes with TEMPLATE_VERSION, which no date tracks, the ETag covers it
+@condition(etag_func=flyer_key)
 def generate_flyer_view(request):
-    title = request.GET.get("title")
-    dt_str = request.GET.get("datetime")
-    location = request.GET.get("location")
-
-    if not all([title, dt_str, location]):
-        return HttpResponse("Missing required parameters", status=400)
-
-    # Use static asset paths
-    logo_path = "assets/flierlogo.png"
-    font_path = "assets/DejaVuSans.ttf"
-
-    with NamedTemporaryFile(suffix=".png") as tmp:
-        generate_flyer(
-            title=title,
-            dt_str=dt_str,
-            location=location,
-            qr_text="scan this",  # or also from GET param
-            logo_path=logo_path,
-            font_path=font_path,
-            output_path=tmp.name
-        )
-
-        with open(tmp.name, "rb") as f:
-            return HttpResponse(f.read(), content_type="image/png")
+    params = flyer_params(request)
+    if params is None:
+        return HttpResponse("Missing or invalid parameters", status=400)
+
+    # shared links are requested over and over, render each flyer once
+    key = flyer_key(request)
+    png = flyer_cache.get(key)
+    if png is None:
+        composer = render_flyer(logo_path=logo_path, font_path=font_path, **params)
+        buffer = io.BytesIO()
+        composer.canvas.save(buffer, format="PNG")
+        png = buffer.getvalue()
+        flyer_cache.put(key, png)
+
+    response = HttpResponse(png, content_type="image/png")
+    patch_cache_control(response, public=True, max_age=settings.FLYER_CACHE_SECONDS)
+    return response
@@ -1,20 +1,25 @@
-import math
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import qrcode
 
+from .fonts import fitting_font_size, load_font
+
 
 DEFAULT_WIDTH = 1570
 DEFAULT_HEIGHT = 2048
 DEFAULT_MARGIN = 60
 
+# Backgrounds and overlays are the same for most flyers, a process keeps this many of each
+LAYER_CACHE_SIZE = 16
+
 
 def parse_event_data(title: str, dt_str: str, location: str, qr_text: str, logo_path: Path, font_path: Path, output_path: Path):
     event_datetime = datetime.fromisoformat(dt_str)
     logo_path = Path(logo_path).resolve()
     font_path = Path(font_path).resolve()
-    output_path = Path(output_path).resolve()
+    output_path = Path(output_path).resolve() if output_path else None
 
     return {
         "title": title,
@@ -27,6 +32,47 @@ def parse_event_data(title: str, dt_str: str, location: str, qr_text: str, logo_
     }
 
 
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def gradient_layer(size, from_color, to_color, direction='vertical'):
+    """Gradient from from_color to to_color, top to bottom, or left to right unless direction is 'vertical'.
+    The returned image is shared, copy it before drawing on it."""
+    # the 256 steps of linear_gradient stretched over the canvas, the mask is never built pixel by pixel
+    mask = Image.linear_gradient('L')
+    if direction != 'vertical':
+        mask = mask.transpose(Image.TRANSPOSE)
+    mask = mask.resize(size, Image.BILINEAR)
+    return Image.composite(Image.new('RGB', size, to_color), Image.new('RGB', size, from_color), mask)
+
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def _overlay_layer(path, mtime, scale_to):
+    overlay = Image.open(path).convert('RGBA')
+    if scale_to:
+        overlay.thumbnail((scale_to, scale_to))
+    return overlay
+
+
+def overlay_layer(png_path, scale_to=None):
+    """The image at png_path as RGBA, shrunk to fit in scale_to x scale_to. Cached until the file changes."""
+    path = Path(png_path).resolve()
+    return _overlay_layer(path, path.stat().st_mtime_ns, scale_to)
+
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def qr_layer(qr_text, max_size=400, border_modules=4):
+    """QR code of qr_text at error correction H, as big as whole pixels per module allow within max_size"""
+    qr = qrcode.QRCode(border=border_modules, error_correction=qrcode.constants.ERROR_CORRECT_H)
+    qr.add_data(qr_text)
+    qr.make(fit=True)
+
+    # one pixel per module, black on white, then scaled up in a single resize
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    modules = Image.frombytes('L', (size, size), bytes(0 if dark else 255 for row in matrix for dark in row))
+    pixel_size = max(1, max_size // size)
+    return modules.resize((size * pixel_size, size * pixel_size), Image.NEAREST).convert('RGB')
+
+
 class ImageComposer:
     def __init__(self, output_width=DEFAULT_WIDTH, output_height=DEFAULT_HEIGHT, background_color='white', margin=DEFAULT_MARGIN, gradient=None):
         self.width = output_width
@@ -41,51 +87,18 @@ class ImageComposer:
         self.draw = ImageDraw.Draw(self.canvas)
 
     def create_gradient_background(self, from_color, to_color, direction='vertical'):
-        base = Image.new('RGB', (self.width, self.height), from_color)
-        top = Image.new('RGB', (self.width, self.height), to_color)
-        mask = Image.new('L', (self.width, self.height))
-        mask_data = []
-
-        if direction == 'vertical':
-            for y in range(self.height):
-                mask_data.extend([int(255 * (y / self.height))] * self.width)
-        else:  # horizontal
-            for y in range(self.height):
-                row = [int(255 * (x / self.width)) for x in range(self.width)]
-                mask_data.extend(row)
-
-        mask.putdata(mask_data)
-        gradient = Image.composite(top, base, mask)
-        return gradient
+        return gradient_layer((self.width, self.height), from_color, to_color, direction).copy()
 
     def add_overlay(self, png_path, x, y, scale_to=None):
-        overlay = Image.open(png_path).convert('RGBA')
-        if scale_to:
-            overlay.thumbnail((scale_to, scale_to))
+        overlay = overlay_layer(png_path, scale_to)
         self.canvas.paste(overlay, (x, y), overlay)
 
     def find_fitting_font(self, text, font_path, max_width, max_height, starting_size=140, angle=45):
-        size = starting_size
-        while size > 10:
-            font = ImageFont.truetype(font_path, size)
-            dummy_img = Image.new("RGBA", (1, 1))
-            draw = ImageDraw.Draw(dummy_img)
-            bbox = draw.textbbox((0, 0), text, font=font)
-            w = bbox[2] - bbox[0]
-            h = bbox[3] - bbox[1]
-
-            # Rotate dims
-            rotated_w = abs(w * math.cos(math.radians(angle))) + abs(h * math.sin(math.radians(angle)))
-            rotated_h = abs(w * math.sin(math.radians(angle))) + abs(h * math.cos(math.radians(angle)))
-
-            if rotated_w <= max_width and rotated_h <= max_height:
-                return font
-            size -= 4  # shrink step
-        return ImageFont.truetype(font_path, 10)  # fallback
-
+        size = fitting_font_size(text, str(font_path), max_width, max_height, starting_size, angle)
+        return load_font(str(font_path), size)
 
     def add_text(self, text, x, y, font=None, font_size=48, color='black', rotate=0, anchor="lt"):
-        font = font or ImageFont.truetype("DejaVuSans.ttf", font_size)
+        font = font or load_font("DejaVuSans.ttf", font_size)
 
         bbox = self.draw.textbbox((0, 0), text, font=font, anchor=anchor)
         w = bbox[2] - bbox[0]
@@ -111,26 +124,8 @@ class ImageComposer:
         return width, height
 
     def add_qr_code(self, qr_text, x, y, max_size=400, border_modules=4):
-        # Temporary QR object to get module count
-        test_qr = qrcode.QRCode(border=border_modules)
-        test_qr.add_data(qr_text)
-        test_qr.make(fit=True)
-
-        num_modules = test_qr.modules_count
-        total_modules = num_modules + 2 * border_modules
-        pixel_size = max(1, max_size // total_modules)
-
-        # Now create QR with correct pixel size
-        qr = qrcode.QRCode(
-            box_size=pixel_size,
-            border=border_modules,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-        )
-        qr.add_data(qr_text)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-        self.canvas.paste(img, (x, y), img)
+        img = qr_layer(qr_text, max_size, border_modules)
+        self.canvas.paste(img, (x, y))
         return img.width
 
 
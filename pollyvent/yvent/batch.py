@@ -0,0 +1,216 @@
+import csv
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from .base import DEFAULT_HEIGHT, DEFAULT_WIDTH, gradient_layer, overlay_layer
+from .fonts import load_font
+from .generator import TEMPLATE_VERSION, render_flyer
+
+FORMATS = ["png", "pdf"]
+# PDF pages of the 1570x2048 flyer come out at about 8x10 inches
+PDF_RESOLUTION = 200
+MANIFEST = ".yvent-batch.json"
+
+
+def read_events(path):
+    """Rows of a CSV or JSON Lines file (by extension) as dicts"""
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def field(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def parse_sheet_datetime(date, time):
+    """
+    ISO datetime of a sheet row, e.g. '5/13/25' and '6:30 PM' or '5-7 PM' (the start is used).
+    Noon when the time is missing or not understood, ValueError for dates like 'Every Wednesday'.
+    """
+    match = re.fullmatch(r"(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})", date.strip())
+    if not match:
+        raise ValueError(f"Not a date: {date}")
+    month, day, year = (int(part) for part in match.groups())
+    year += 2000 if year < 100 else 0
+
+    hour, minute = 12, 0
+    time = (time or "").strip().lower()
+    start = re.match(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", time)
+    if start:
+        hour, minute = int(start.group(1)), int(start.group(2) or 0)
+        # '5-7 PM': the meridiem of the range applies to its start
+        meridiem = start.group(3) or next(iter(re.findall(r"(am|pm)", time)), None)
+        if meridiem == "pm" and hour < 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+        if hour > 23 or minute > 59:
+            hour, minute = 12, 0
+    return datetime(year, month, day, hour, minute).isoformat(timespec="minutes")
+
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:80]
+
+
+def event_jobs(rows, output_dir, output_format, qr_text=None):
+    """
+    Flyers to render for the rows, either in the generator's own fields (title, datetime, location,
+    qr_text, output) or in the shape of the events sheet (Event Name, Date, Time (Local), Location, City).
+    Yields (job, None) or (None, reason the row is skipped).
+    """
+    names = set()
+    for number, row in enumerate(rows, start=1):
+        title = field(row, "title", "Event Name")
+        if not title:
+            yield None, f"row {number}: no title"
+            continue
+        dt_str = field(row, "datetime")
+        if not dt_str:
+            try:
+                dt_str = parse_sheet_datetime(field(row, "Date") or "", field(row, "Time (Local)", "Time"))
+            except ValueError as e:
+                yield None, f"row {number}: {e}"
+                continue
+        try:
+            datetime.fromisoformat(dt_str)
+        except ValueError:
+            yield None, f"row {number}: not an ISO datetime: {dt_str}"
+            continue
+        location = field(row, "location")
+        if not location:
+            location = ", ".join(filter(None, [field(row, "Location"), field(row, "City")]))
+
+        name = field(row, "output") or f"{dt_str[:10]}-{slugify(title)}"
+        name = Path(name).stem
+        # the same event can be listed twice
+        unique_name, n = name, 1
+        while unique_name in names:
+            n += 1
+            unique_name = f"{name}-{n}"
+        names.add(unique_name)
+
+        yield {
+            "title": title,
+            "dt_str": dt_str,
+            "location": location,
+            "qr_text": field(row, "qr_text", "QR") or qr_text,
+            "output_path": str(Path(output_dir) / f"{unique_name}.{output_format}"),
+        }, None
+
+
+def job_key(job, logo_path, font_path):
+    """Hash of everything a flyer depends on, an output with the same key does not need rendering again"""
+    parts = [
+        job,
+        TEMPLATE_VERSION,
+        os.stat(logo_path).st_mtime_ns,
+        os.stat(font_path).st_mtime_ns,
+    ]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+_assets = {}
+
+
+def preload(logo_path, font_path):
+    """Process pool initializer: build the layers every flyer shares once per worker"""
+    _assets["logo_path"] = logo_path
+    _assets["font_path"] = font_path
+    gradient_layer((DEFAULT_WIDTH, DEFAULT_HEIGHT), "white", "blue", "vertical")
+    overlay_layer(logo_path, 750)
+    for size in (48, 38):
+        load_font(str(font_path), size)
+
+
+def render_job(job):
+    composer = render_flyer(
+        title=job["title"],
+        dt_str=job["dt_str"],
+        location=job["location"],
+        qr_text=job["qr_text"],
+        logo_path=_assets["logo_path"],
+        font_path=_assets["font_path"],
+    )
+    output_path = Path(job["output_path"])
+    # written next to the output and renamed, an interrupted run leaves no truncated flyer
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    output_format = output_path.suffix[1:].upper()
+    try:
+        if output_format == "PDF":
+            composer.canvas.save(tmp_path, format=output_format, resolution=PDF_RESOLUTION)
+        else:
+            composer.canvas.save(tmp_path, format=output_format)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, output_path)
+    return job["output_path"]
+
+
+def generate_batch(events_path, output_dir, logo_path, font_path, output_format="png", qr_text=None,
+                   workers=None, force=False, log=print):
+    """
+    Render a flyer per event of events_path into output_dir, across a pool of worker processes.
+    Flyers whose inputs did not change since the last run are skipped unless force is set.
+    :return: Dict with the number of rendered, unchanged, skipped and failed flyers.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logo_path, font_path = Path(logo_path).resolve(), Path(font_path).resolve()
+
+    manifest_path = output_dir / MANIFEST
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    stats = {"rendered": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    pending = {}
+    for job, reason in event_jobs(read_events(events_path), output_dir, output_format, qr_text):
+        if job is None:
+            log(f"Skipping {reason}")
+            stats["skipped"] += 1
+            continue
+        key = job_key(job, logo_path, font_path)
+        name = Path(job["output_path"]).name
+        if not force and manifest.get(name) == key and os.path.exists(job["output_path"]):
+            stats["unchanged"] += 1
+            continue
+        pending[name] = (job, key)
+
+    try:
+        if pending:
+            with ProcessPoolExecutor(workers, initializer=preload, initargs=(logo_path, font_path)) as pool:
+                futures = {pool.submit(render_job, job): (name, key) for name, (job, key) in pending.items()}
+                for future in as_completed(futures):
+                    name, key = futures[future]
+                    try:
+                        log(future.result())
+                    except Exception as e:
+                        log(f"Failed {name}: {e}")
+                        stats["failed"] += 1
+                        continue
+                    manifest[name] = key
+                    stats["rendered"] += 1
+    finally:
+        tmp_manifest = manifest_path.with_name(f"{MANIFEST}.tmp")
+        tmp_manifest.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp_manifest, manifest_path)
+
+    return stats
@@ -1,5 +1,7 @@
 import argparse
+import sys
 from pathlib import Path
+from yvent.batch import FORMATS, generate_batch
 from yvent.generator import generate_flyer_from_args
 
 def get_parser():
@@ -15,7 +17,41 @@ def get_parser():
     parser.add_argument('--output-path', type=Path, required=True, help='Path to save the output image or PDF')
     return parser
 
+def get_batch_parser():
+    parser = argparse.ArgumentParser(
+        prog="yvent batch",
+        description="Generate a flier for every event of a CSV or JSON Lines file."
+    )
+    parser.add_argument('events', type=Path, help='CSV or .jsonl file with title, datetime, location, qr_text '
+                        '(and optionally output) per event, or the columns of the events sheet')
+    parser.add_argument('--output-dir', type=Path, required=True, help='Directory to save the fliers in')
+    parser.add_argument('--logo-path', type=Path, required=True, help='Path to the logo image file')
+    parser.add_argument('--font-path', type=Path, required=True, help='Path to the font file (e.g., .ttf)')
+    parser.add_argument('--format', choices=FORMATS, default='png', help='Output format of the fliers')
+    parser.add_argument('--qr-text', help='Text to encode in the QR code of events without one')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='Render fliers whose inputs did not change too')
+    return parser
+
+def batch(argv):
+    args = get_batch_parser().parse_args(argv)
+    stats = generate_batch(
+        args.events,
+        args.output_dir,
+        logo_path=args.logo_path,
+        font_path=args.font_path,
+        output_format=args.format,
+        qr_text=args.qr_text,
+        workers=args.workers,
+        force=args.force,
+    )
+    print(", ".join(f"{count} {name}" for name, count in stats.items()))
+    return 1 if stats["failed"] else 0
+
 def main():
+    # `yvent batch ...` renders many fliers, plain `yvent --title ...` a single one
+    if sys.argv[1:2] == ['batch']:
+        sys.exit(batch(sys.argv[2:]))
     args = get_parser().parse_args()
     generate_flyer_from_args(args)
 
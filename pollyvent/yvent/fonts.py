@@ -0,0 +1,49 @@
+import math
+from functools import lru_cache
+
+from PIL import ImageFont
+
+MIN_FONT_SIZE = 10
+# fitted sizes step down from the maximum by this much, as they always have
+SIZE_STEP = 4
+
+
+@lru_cache(maxsize=64)
+def load_font(font_path, size):
+    """FreeTypeFont of font_path at size, parsed once per process and shared by every flyer"""
+    return ImageFont.truetype(str(font_path), size)
+
+
+@lru_cache(maxsize=4096)
+def text_size(text, font_path, size):
+    left, top, right, bottom = load_font(font_path, size).getbbox(text)
+    return right - left, bottom - top
+
+
+def rotated_size(width, height, angle):
+    """Size of the box around a width x height box rotated by angle degrees"""
+    cos = abs(math.cos(math.radians(angle)))
+    sin = abs(math.sin(math.radians(angle)))
+    return width * cos + height * sin, width * sin + height * cos
+
+
+@lru_cache(maxsize=1024)
+def fitting_font_size(text, font_path, max_width, max_height, max_size=140, angle=0):
+    """
+    Largest of max_size, max_size - SIZE_STEP, ... above MIN_FONT_SIZE at which text, rotated by angle degrees,
+    fits in max_width x max_height, MIN_FONT_SIZE when none does. Text grows with the size, so this is a binary
+    search.
+    """
+    font_path = str(font_path)
+    sizes = range(max_size, MIN_FONT_SIZE, -SIZE_STEP)
+    low, high = 0, len(sizes) - 1
+    best = MIN_FONT_SIZE
+    while low <= high:
+        middle = (low + high) // 2
+        width, height = rotated_size(*text_size(text, font_path, sizes[middle]), angle)
+        if width <= max_width and height <= max_height:
+            best = sizes[middle]
+            high = middle - 1
+        else:
+            low = middle + 1
+    return best
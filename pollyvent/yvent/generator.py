@@ -1,6 +1,10 @@
 import textwrap
+from pathlib import Path
 from .base import ImageComposer, parse_event_data
-from PIL import ImageFont
+from .fonts import load_font
+
+# Part of the cache key of rendered flyers, bump it when the layout below changes
+TEMPLATE_VERSION = 1
 
 def generate_flyer_from_args(args):
     return generate_flyer(
@@ -14,6 +18,11 @@ def generate_flyer_from_args(args):
     )
 
 def generate_flyer(title, dt_str, location, qr_text, logo_path, font_path, output_path):
+    composer = render_flyer(title, dt_str, location, qr_text, logo_path, font_path)
+    composer.save_to(Path(output_path).resolve())
+
+def render_flyer(title, dt_str, location, qr_text, logo_path, font_path):
+    """Lay out the flyer in memory, returns the ImageComposer holding it"""
     data = parse_event_data(
         title=title,
         dt_str=dt_str,
@@ -21,7 +30,7 @@ def generate_flyer(title, dt_str, location, qr_text, logo_path, font_path, outpu
         qr_text=qr_text,
         logo_path=logo_path,
         font_path=font_path,
-        output_path=output_path,
+        output_path=None,
     )
 
     event_date = data["datetime"].strftime("%B %d, %Y")
@@ -37,8 +46,8 @@ def generate_flyer(title, dt_str, location, qr_text, logo_path, font_path, outpu
         max_height=composer.height - 2 * composer.margin
     )
 
-    info_font = ImageFont.truetype(str(data["font_path"]), 48)
-    location_font = ImageFont.truetype(str(data["font_path"]), 38)
+    info_font = load_font(str(data["font_path"]), 48)
+    location_font = load_font(str(data["font_path"]), 38)
 
     center_x = composer.width // 2
     center_y = composer.height // 2
@@ -75,4 +84,4 @@ def generate_flyer(title, dt_str, location, qr_text, logo_path, font_path, outpu
         composer.add_text(text, x=text_x, y=current_y, font=font)
         current_y += bbox[3] - bbox[1] + spacing
 
-    composer.save_to(data["output_path"])
+    return composer
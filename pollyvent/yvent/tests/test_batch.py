@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from yvent import batch
+
+ASSETS = Path(__file__).resolve().parent.parent / "assets"
+LOGO_PATH = ASSETS / "flierlogo.png"
+FONT_PATH = ASSETS / "DejaVuSans.ttf"
+
+EVENTS = [
+    {"title": "March", "datetime": "2025-04-05T12:00", "location": "City Hall", "output": "march"},
+    {"title": "Rally", "datetime": "2025-05-13T18:30", "location": "State House", "output": "rally"},
+]
+
+
+def write_events(path, events):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(events[0]))
+        writer.writeheader()
+        writer.writerows(events)
+    return path
+
+
+def run(events_path, output_dir, **kwargs):
+    return batch.generate_batch(
+        events_path, output_dir, LOGO_PATH, FONT_PATH, workers=1, log=lambda message: None, **kwargs
+    )
+
+
+def test_rerun_skips_unchanged_flyers(tmp_path):
+    events_path = write_events(tmp_path / "events.csv", EVENTS)
+    output_dir = tmp_path / "flyers"
+
+    assert run(events_path, output_dir) == {"rendered": 2, "unchanged": 0, "skipped": 0, "failed": 0}
+    manifest = json.loads((output_dir / batch.MANIFEST).read_text())
+    assert sorted(manifest) == ["march.png", "rally.png"]
+    for name in manifest:
+        with Image.open(output_dir / name) as image:
+            assert image.size == (batch.DEFAULT_WIDTH, batch.DEFAULT_HEIGHT)
+    mtimes = {name: os.stat(output_dir / name).st_mtime_ns for name in manifest}
+
+    assert run(events_path, output_dir) == {"rendered": 0, "unchanged": 2, "skipped": 0, "failed": 0}
+    assert {name: os.stat(output_dir / name).st_mtime_ns for name in manifest} == mtimes
+
+    # a changed row is rendered again, the other one is not
+    write_events(events_path, [{**EVENTS[0], "location": "Monument Circle"}, EVENTS[1]])
+    assert run(events_path, output_dir) == {"rendered": 1, "unchanged": 1, "skipped": 0, "failed": 0}
+    assert json.loads((output_dir / batch.MANIFEST).read_text())["rally.png"] == manifest["rally.png"]
+    assert json.loads((output_dir / batch.MANIFEST).read_text())["march.png"] != manifest["march.png"]
+
+    assert run(events_path, output_dir, force=True)["rendered"] == 2
+    assert not list(output_dir.glob("*.tmp")) and not list(output_dir.glob(".*.tmp"))
+
+
+def test_interrupted_write_keeps_the_previous_flyer(tmp_path):
+    output_path = tmp_path / "march.png"
+    output_path.write_bytes(b"previous flyer")
+    job = {
+        "title": "March",
+        "dt_str": "2025-04-05T12:00",
+        "location": "City Hall",
+        "qr_text": "scan this",
+        "output_path": str(output_path),
+    }
+    batch.preload(LOGO_PATH, FONT_PATH)
+
+    def interrupted_save(image, path, *args, **kwargs):
+        Path(path).write_bytes(b"half a flyer")
+        raise KeyboardInterrupt
+
+    with mock.patch.object(Image.Image, "save", interrupted_save), pytest.raises(KeyboardInterrupt):
+        batch.render_job(job)
+
+    assert output_path.read_bytes() == b"previous flyer"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["march.png"]
+
+    assert batch.render_job(job) == str(output_path)
+    with Image.open(output_path) as image:
+        assert image.format == "PNG"
@@ -0,0 +1,47 @@
+import math
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from yvent.fonts import fitting_font_size
+
+FONT_PATH = str(Path(__file__).resolve().parent.parent / "assets" / "DejaVuSans.ttf")
+
+TITLES = [
+    "Rally",
+    "No Kings",
+    "We Have Only this Planet; The Environment Matters",
+    "Hands Off Our Social Security, Medicaid and Medicare",
+    "W" * 60,
+]
+
+
+def linear_fitting_size(text, max_width, max_height, starting_size=140, angle=45):
+    """The search find_fitting_font used to do, stepping the size down by 4"""
+    size = starting_size
+    while size > 10:
+        font = ImageFont.truetype(FONT_PATH, size)
+        draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        bbox = draw.textbbox((0, 0), text, font=font)
+        w = bbox[2] - bbox[0]
+        h = bbox[3] - bbox[1]
+        rotated_w = abs(w * math.cos(math.radians(angle))) + abs(h * math.sin(math.radians(angle)))
+        rotated_h = abs(w * math.sin(math.radians(angle))) + abs(h * math.cos(math.radians(angle)))
+        if rotated_w <= max_width and rotated_h <= max_height:
+            return size
+        size -= 4
+    return 10
+
+
+def test_binary_search_finds_the_size_of_the_linear_search():
+    for title in TITLES:
+        for max_width, max_height in [(1450, 1000), (800, 600), (300, 300), (40, 40)]:
+            for angle in [0, 45]:
+                expected = linear_fitting_size(title, max_width, max_height, angle=angle)
+                assert fitting_font_size(title, FONT_PATH, max_width, max_height, 140, angle) == expected
+
+
+def test_other_starting_sizes():
+    for starting_size in [139, 100, 12]:
+        expected = linear_fitting_size(TITLES[2], 800, 600, starting_size)
+        assert fitting_font_size(TITLES[2], FONT_PATH, 800, 600, starting_size, 45) == expected
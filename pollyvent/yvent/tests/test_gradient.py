@@ -0,0 +1,50 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from yvent.base import ImageComposer, gradient_layer
+
+SIZES = [(1570, 2048), (300, 200), (64, 900)]
+
+
+def per_row_gradient(size, from_color, to_color, direction):
+    """The mask create_gradient_background used to build value by value"""
+    width, height = size
+    mask = Image.new("L", size)
+    if direction == "vertical":
+        mask.putdata([int(255 * (y / height)) for y in range(height) for _ in range(width)])
+    else:
+        mask.putdata([int(255 * (x / width)) for _ in range(height) for x in range(width)])
+    return Image.composite(Image.new("RGB", size, to_color), Image.new("RGB", size, from_color), mask)
+
+
+def pixels(image):
+    return np.asarray(image).astype(int)
+
+
+def test_gradient_matches_the_per_row_gradient():
+    for size in SIZES:
+        for direction in ["vertical", "horizontal"]:
+            expected = pixels(per_row_gradient(size, "white", "blue", direction))
+            gradient = pixels(gradient_layer(size, "white", "blue", direction))
+            assert gradient.shape == expected.shape
+            assert np.abs(gradient - expected).max() <= 3
+
+
+def test_gradient_endpoints_and_orientation():
+    for size in SIZES:
+        vertical = pixels(gradient_layer(size, "white", "blue", "vertical"))
+        # every row is one color, white at the top and blue at the bottom
+        assert (vertical == vertical[:, :1]).all()
+        assert np.abs(vertical[0, 0] - [255, 255, 255]).max() <= 3
+        assert np.abs(vertical[-1, 0] - [0, 0, 255]).max() <= 3
+
+        horizontal = pixels(gradient_layer(size, "white", "blue", "horizontal"))
+        assert (horizontal == horizontal[:1, :]).all()
+        assert np.abs(horizontal[0, 0] - [255, 255, 255]).max() <= 3
+        assert np.abs(horizontal[0, -1] - [0, 0, 255]).max() <= 4
+
+
+def test_drawing_does_not_change_the_cached_gradient():
+    composer = ImageComposer(300, 200, gradient=("white", "blue", "vertical"))
+    ImageDraw.Draw(composer.canvas).rectangle((0, 0, 299, 199), fill="red")
+    assert pixels(gradient_layer((300, 200), "white", "blue", "vertical"))[0, 0].tolist() == [255, 255, 255]
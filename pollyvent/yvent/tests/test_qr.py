@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import qrcode
+from qrcode import util
+
+from yvent.base import ImageComposer, qr_layer
+
+TEXTS = ["scan this", "https://example.org/events/2025-04-05-march?utm_source=flyer", "x" * 300]
+
+
+def modules(image, border_modules=4):
+    """Module matrix read back from the image, True where dark, without the quiet zone"""
+    pixels = np.asarray(image.convert("L"))
+    for size in range(21, pixels.shape[0] + 1):
+        total = size + 2 * border_modules
+        if pixels.shape[0] % total == 0 and (size - 17) % 4 == 0:
+            pixel_size = pixels.shape[0] // total
+            centers = np.arange(total) * pixel_size + pixel_size // 2
+            matrix = pixels[np.ix_(centers, centers)] < 128
+            # every module must be a solid block of pixels
+            blocks = np.kron(matrix, np.ones((pixel_size, pixel_size), dtype=bool))
+            if (blocks == (pixels < 128)).all():
+                return matrix[border_modules:-border_modules, border_modules:-border_modules]
+    raise AssertionError("not a QR code image")
+
+
+def format_info(matrix):
+    """(error correction, mask pattern) read from the format bits next to the top left finder pattern"""
+    n = len(matrix)
+    bits = 0
+    for i in range(15):
+        if i < 6:
+            dark = matrix[i][8]
+        elif i < 8:
+            dark = matrix[i + 1][8]
+        else:
+            dark = matrix[n - 15 + i][8]
+        bits |= int(dark) << i
+    for data in range(32):
+        if util.BCH_type_info(data) == bits:
+            return data >> 3, data & 7
+    raise AssertionError("invalid format information")
+
+
+def test_qr_code_uses_error_correction_h():
+    for text in TEXTS:
+        error_correction, _ = format_info(modules(qr_layer(text)))
+        assert error_correction == qrcode.constants.ERROR_CORRECT_H
+
+
+def test_qr_code_encodes_the_text():
+    for text in TEXTS:
+        qr = qrcode.QRCode(border=0, error_correction=qrcode.constants.ERROR_CORRECT_H)
+        qr.add_data(text)
+        qr.make(fit=True)
+        assert modules(qr_layer(text)).tolist() == qr.get_matrix()
+
+
+def test_qr_code_fits_in_max_size():
+    for text in TEXTS:
+        for max_size in [400, 250]:
+            image = qr_layer(text, max_size)
+            assert image.width == image.height <= max_size
+
+
+def test_qr_code_decodes():
+    pyzbar = pytest.importorskip("pyzbar.pyzbar")
+    for text in TEXTS:
+        composer = ImageComposer(600, 600)
+        composer.add_qr_code(text, 100, 100)
+        assert [symbol.data.decode() for symbol in pyzbar.decode(composer.canvas)] == [text]